@@ -0,0 +1,4 @@
+"""Benchmarks and load tests for the expense tracker.
+
+Run the modules from the repository root, e.g. ``python -m benchmarks.loadtest``.
+"""
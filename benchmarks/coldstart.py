@@ -0,0 +1,133 @@
+"""Cold-start benchmark: import time, app creation and time to first response.
+
+Times, each --repeat times in fresh interpreters:
+
+* import: cumulative `python -X importtime` time of `import expense_tracker_app`,
+  checked against --budget-ms (exits non-zero when the median is over it), with
+  the heaviest top-level packages and any lazily loaded dependency (numpy,
+  requests, flask_mail, flask_migrate) that was imported eagerly
+* in-process: import, create_app() and a first GET /login on the test client
+* gunicorn: from launch to the first 200 from /login with --workers workers,
+  with and without preload (gunicorn.conf.py), when gunicorn is installed
+
+Usage:
+    python -m benchmarks.coldstart [--repeat 5] [--budget-ms 400] [--workers 4]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAZY_MODULES = ['numpy', 'requests', 'flask_mail', 'flask_migrate']
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+IN_PROCESS = """
+import json, sys, time
+started = time.perf_counter()
+import expense_tracker_app
+imported = time.perf_counter()
+app = expense_tracker_app.create_app()
+created = time.perf_counter()
+status = app.test_client().get('/login').status_code
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_response': answered - created,
+                  'status': status, 'eager': [name for name in %r if name in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def measure_import(env):
+    # (cumulative ms of expense_tracker_app, {top-level package: self ms})
+    stderr = run_python(['-X', 'importtime', '-c', 'import expense_tracker_app'], env).stderr
+    total, packages = None, Counter()
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        packages[name.split('.')[0]] += int(self_us) / 1000
+        if name == 'expense_tracker_app':
+            total = int(cumulative_us) / 1000
+    return total, packages
+
+
+def time_gunicorn(workers, port, env, preload):
+    env = dict(env, GUNICORN_PRELOAD='1' if preload else '0')
+    started = time.perf_counter()
+    process = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                                'expense_tracker_app:create_app()'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not answer within 60s')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=400, help='import-time budget for the median')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--top', type=int, default=8, help='heaviest packages to list')
+    args = parser.parse_args()
+
+    # /login renders without touching the database, so an empty file is enough
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'coldstart.db'),
+               LOG_LEVEL='WARNING')
+    run_python(['-c', 'import expense_tracker_app'], env)  # write the bytecode caches first
+
+    totals, packages = [], Counter()
+    for _ in range(args.repeat):
+        total, by_package = measure_import(env)
+        totals.append(total)
+        packages.update(by_package)
+    median = statistics.median(totals)
+    print(f"import expense_tracker_app: median {median:.1f} ms, min {min(totals):.1f} ms "
+          f"(budget {args.budget_ms:.0f} ms)")
+    for name, self_ms in packages.most_common(args.top):
+        print(f"  {name:>24}: {self_ms / args.repeat:7.1f} ms")
+
+    runs = [json.loads(run_python(['-c', IN_PROCESS], env).stdout) for _ in range(args.repeat)]
+    print("In-process (test client):")
+    for step in ('import', 'create_app', 'first_response'):
+        print(f"  {step:>24}: {statistics.median(run[step] for run in runs) * 1000:7.1f} ms")
+    eager = runs[0]['eager']
+    if eager:
+        print(f"  imported eagerly: {', '.join(eager)}")
+
+    if shutil.which('gunicorn'):
+        print(f"gunicorn, {args.workers} workers, launch to first response:")
+        for preload in (False, True):
+            timings = [time_gunicorn(args.workers, args.port, env, preload) for _ in range(args.repeat)]
+            print(f"  {'preload' if preload else 'no preload':>24}: {statistics.median(timings) * 1000:7.1f} ms")
+    else:
+        print("gunicorn not installed; skipping the server timings")
+
+    if median > args.budget_ms or eager:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
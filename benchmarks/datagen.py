@@ -0,0 +1,166 @@
+"""Synthetic multi-user data generator.
+
+Seeds N users x M transactions with realistic distributions: monthly
+salaries, occasional bonuses and gifts, log-normal expense amounts per
+category, more spending on weekends and a small share of transactions
+recorded in a foreign currency. Rollups are rebuilt afterwards so the
+dashboard and reports see consistent totals.
+
+Usage:
+    python -m benchmarks.datagen --users 100 --transactions 10000 [--database-url URL [--destroy]]
+
+The tables are dropped and recreated first. A database that already holds
+rows is refused unless --destroy is passed.
+
+Every user's password is ``benchmark-password`` and usernames are
+``bench0`` ... ``bench{N-1}``.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PASSWORD = 'benchmark-password'
+# category -> (weight, median amount, spread)
+EXPENSE_PROFILE = {
+    'Food': (45, 18.0, 0.6),
+    'Transport': (25, 12.0, 0.5),
+    'Entertainment': (12, 35.0, 0.8),
+    'Bills': (8, 120.0, 0.5),
+    'Other': (10, 40.0, 1.0),
+}
+INCOME_PROFILE = {
+    'Salary': (0, 3500.0, 0.2),  # generated monthly, not sampled
+    'Bonus': (10, 800.0, 0.6),
+    'Freelance': (60, 450.0, 0.7),
+    'Gift': (30, 60.0, 0.8),
+}
+DESCRIPTIONS = {
+    'Food': ['groceries', 'lunch', 'coffee', 'dinner out', 'takeaway'],
+    'Transport': ['bus fare', 'train ticket', 'fuel', 'taxi', 'parking'],
+    'Entertainment': ['cinema', 'concert', 'streaming', 'books', 'games'],
+    'Bills': ['electricity', 'water', 'internet', 'phone', 'rent share'],
+    'Other': ['gift for friend', 'pharmacy', 'clothes', 'repairs', 'donation'],
+    'Bonus': ['quarterly bonus'], 'Freelance': ['client project', 'consulting'], 'Gift': ['birthday gift'],
+    'Salary': ['monthly salary'],
+}
+
+
+def weighted_choice(rng, profile):
+    categories = [c for c, (w, _, _) in profile.items() if w]
+    return rng.choices(categories, weights=[profile[c][0] for c in categories])[0]
+
+
+def sample_amount(rng, profile, category):
+    _, median, spread = profile[category]
+    return round(max(0.01, rng.lognormvariate(math.log(median), spread)), 2)
+
+
+def sample_date(rng, start, days):
+    # Weekends get roughly twice the spending of weekdays
+    while True:
+        date = start + timedelta(days=rng.randrange(days), minutes=rng.randrange(24 * 60))
+        if date.weekday() >= 5 or rng.random() < 0.5:
+            return date
+
+
+def generate_user_rows(rng, user_id, currency, transactions, start, days, currencies, foreign_share):
+    rows = {'Expense': [], 'Income': []}
+    months = max(1, days // 30)
+    for month in range(months):
+        payday = (start + timedelta(days=30 * month)).replace(day=1, hour=9, minute=0)
+        rows['Income'].append((user_id, sample_amount(rng, INCOME_PROFILE, 'Salary'), currency, 'Salary',
+                               'monthly salary', payday))
+    for _ in range(max(0, transactions - months)):
+        type = 'Income' if rng.random() < 0.05 else 'Expense'
+        profile = INCOME_PROFILE if type == 'Income' else EXPENSE_PROFILE
+        category = weighted_choice(rng, profile)
+        row_currency = rng.choice(currencies) if rng.random() < foreign_share else currency
+        rows[type].append((user_id, sample_amount(rng, profile, category), row_currency, category,
+                           rng.choice(DESCRIPTIONS[category]), sample_date(rng, start, days)))
+    return rows
+
+
+def reset_database(db, destroy=False):
+    """Drop and recreate the app's tables, refusing (exiting) when any of them holds rows unless destroy is set."""
+    if not destroy:
+        inspector = db.inspect(db.engine)
+        occupied = [table.name for table in db.metadata.sorted_tables if inspector.has_table(table.name)
+                    and db.session.execute(db.select(1).select_from(table).limit(1)).first()]
+        db.session.rollback()
+        if occupied:
+            sys.exit(f"{db.engine.url.render_as_string()} already holds data ({', '.join(occupied)}); "
+                     f"pass --destroy to drop it")
+    db.drop_all()
+    db.create_all()
+
+
+def seed(users, transactions, years=3, foreign_share=0.02, seed_value=1, reset=True, destroy=False, log=print):
+    """Create users and transactions in the configured database; returns the list of usernames.
+
+    With reset the tables are dropped first, which only a database without rows allows unless destroy is set.
+    """
+    from expense_tracker_app import (app, db, User, Expense, Income, ExchangeRate, SUPPORTED_CURRENCIES,
+                                     BASE_CURRENCY, hash_password, rebuild_rollups)
+    rng = random.Random(seed_value)
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    days = 365 * years
+    start = end - timedelta(days=days)
+    columns = ('user_id', 'amount', 'currency', 'category', 'description', 'date')
+    started = time.perf_counter()
+    with app.app_context():
+        if reset:
+            reset_database(db, destroy)
+        else:
+            db.create_all()
+        # Fresh rates so nothing in the benchmark calls the exchange-rate API
+        for currency, rate in (('USD', 1.0), ('EUR', 0.92), ('GBP', 0.79), ('NGN', 1550.0)):
+            if currency in SUPPORTED_CURRENCIES:
+                db.session.add(ExchangeRate(from_currency=BASE_CURRENCY, to_currency=currency, rate=rate))
+        password_hash = hash_password(PASSWORD)
+        usernames = []
+        for i in range(users):
+            currency = rng.choices(SUPPORTED_CURRENCIES, weights=[50, 25, 15, 10][:len(SUPPORTED_CURRENCIES)])[0]
+            user = User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash=password_hash,
+                        currency=currency)
+            db.session.add(user)
+            db.session.flush()
+            usernames.append(user.username)
+            rows = generate_user_rows(rng, user.id, currency, transactions, start, days,
+                                      SUPPORTED_CURRENCIES, foreign_share)
+            for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+                for offset in range(0, len(rows[type]), 10000):
+                    db.session.execute(model.__table__.insert(),
+                                       [dict(zip(columns, row)) for row in rows[type][offset:offset + 10000]])
+            if (i + 1) % 10 == 0:
+                db.session.commit()
+                log(f"  seeded {i + 1}/{users} users")
+        db.session.commit()
+        rebuild_rollups()
+    log(f"Seeded {users} users x {transactions} transactions in {time.perf_counter() - started:.1f}s")
+    return usernames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--transactions', type=int, default=10000, help='transactions per user')
+    parser.add_argument('--years', type=int, default=3, help='history length')
+    parser.add_argument('--foreign-share', type=float, default=0.02,
+                        help='share of transactions recorded in a non-home currency')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    seed(args.users, args.transactions, args.years, args.foreign_share, args.seed, destroy=args.destroy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Peak-memory benchmark for the streaming CSV export.
+
+For each size, seeds a SQLite database with one user holding that many
+transactions (split between expenses and incomes), then streams
+/export_expenses through the Flask test client in a fresh process and
+reports the peak RSS growth. With a streaming export the growth should stay
+flat as the row count rises.
+
+Usage:
+    python -m benchmarks.export_memory [--sizes 1000,10000,100000,1000000,5000000] [--gzip]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_kb():
+    # ru_maxrss is KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def seed(rows):
+    from expense_tracker_app import app, db, User, Expense, Income
+    rng = random.Random(rows)
+    start = datetime(2015, 1, 1)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='bench', email='bench@example.com', password_hash='x', currency='USD'))
+        db.session.commit()
+        batch = 20000
+        for offset in range(0, rows, batch):
+            size = min(batch, rows - offset)
+            for model in (Expense, Income):
+                db.session.execute(model.__table__.insert(), [
+                    {'user_id': 1, 'amount': round(rng.uniform(1, 500), 2), 'currency': 'USD',
+                     'category': 'Other', 'description': 'benchmark row',
+                     'date': start + timedelta(minutes=rng.randrange(5_000_000))}
+                    for _ in range(size // 2 + (model is Expense and size % 2))
+                ])
+            db.session.commit()
+
+
+def measure(use_gzip):
+    from expense_tracker_app import app
+    app.config['TESTING'] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    baseline = peak_rss_kb()
+    started = time.perf_counter()
+    response = client.get('/export_expenses' + ('?gzip=1' if use_gzip else ''))
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'bytes': size, 'seconds': elapsed, 'baseline_rss_kb': baseline,
+                      'peak_rss_kb': peak_rss_kb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000,5000000')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--child', choices=['seed', 'measure'], help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == 'seed':
+        return seed(args.rows)
+    if args.child == 'measure':
+        return measure(args.gzip)
+
+    print(f"{'rows':>10} {'export MB':>10} {'seconds':>8} {'peak RSS growth MB':>19}")
+    for rows in (int(size) for size in args.sizes.split(',')):
+        # Without the SQLite pragmas: pages of the database file mapped by mmap_size count towards peak RSS,
+        # which would hide the export's own memory behind up to 256 MB of (reclaimable) file cache
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'export.db'),
+                   SQLITE_PRAGMAS='0')
+        command = [sys.executable, '-m', 'benchmarks.export_memory', '--child']
+        subprocess.run(command + ['seed', '--rows', str(rows)], cwd=ROOT, env=env, check=True,
+                       stderr=subprocess.DEVNULL)
+        child = command + ['measure'] + (['--gzip'] if args.gzip else [])
+        output = subprocess.run(child, cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        growth_mb = (result['peak_rss_kb'] - result['baseline_rss_kb']) / 1024
+        print(f"{rows:>10} {result['bytes'] / 2**20:>10.1f} {result['seconds']:>8.2f} {growth_mb:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
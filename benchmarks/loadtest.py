@@ -0,0 +1,337 @@
+"""Multi-user load test for the main routes.
+
+Seeds synthetic data (see benchmarks.datagen), then drives dashboard,
+financial_report, export_expenses, add_expense and update_currency with a
+weighted mix from --concurrency virtual users. Two drivers are available:
+
+* ``--mode client`` (default) runs the app in-process through the Flask test
+  client and counts SQL statements per request exactly.
+* ``--mode http`` sends real HTTP requests to ``--url``, or to a gunicorn it
+  starts itself with ``--start-gunicorn N``. Queries per request are then
+  taken from /metrics deltas, which are only exact with a single worker;
+  METRICS_TOKEN must match the server's (a random one is set for
+  --start-gunicorn).
+
+Reports p50/p95/p99 latency, queries per request and peak RSS, and writes
+machine-readable JSON (including the git commit) to --output so runs can be
+compared across commits.
+
+Usage:
+    python -m benchmarks.loadtest --users 20 --transactions 5000 --requests 2000 --concurrency 8
+    python -m benchmarks.loadtest --mode http --start-gunicorn 4 --output run.json
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks import datagen  # noqa: E402
+
+DEFAULT_MIX = 'dashboard=40,financial_report=25,export_expenses=5,add_expense=25,update_currency=5'
+ENDPOINTS = ['dashboard', 'financial_report', 'export_expenses', 'add_expense', 'update_currency']
+CURRENCIES = ['USD', 'EUR', 'GBP', 'NGN']
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def scenario_request(name, rng):
+    # Returns (method, path, form data) for one request of the given scenario
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    if name == 'dashboard':
+        return 'GET', '/dashboard', None
+    if name == 'financial_report':
+        if rng.random() < 0.5:
+            return 'GET', '/financial_report', None
+        return 'GET', f'/financial_report?month=All&year={datetime.utcnow().year - rng.randrange(3)}', None
+    if name == 'export_expenses':
+        return 'GET', '/export_expenses', None
+    if name == 'add_expense':
+        return 'POST', '/add_expense', {'amount': f'{rng.uniform(1, 80):.2f}', 'category': 'Food',
+                                        'description': 'load test', 'date': today}
+    if name == 'update_currency':
+        return 'POST', '/update_currency', {'currency': rng.choice(CURRENCIES)}
+    raise ValueError(name)
+
+
+class ClientDriver:
+    """In-process driver using the Flask test client."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from expense_tracker_app import app, db, User
+        self.app = app
+        self.db = db
+        self.User = User
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.local = threading.local()
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def count_statement(*args):
+            self.local.statements = getattr(self.local, 'statements', 0) + 1
+
+    def session(self, username):
+        client = self.app.test_client()
+        with self.app.app_context():
+            user_id = self.db.session.query(self.User.id).filter_by(username=username).scalar()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def request(self, client, method, path, data):
+        self.local.statements = 0
+        response = client.open(path, method=method, data=data)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return response.status_code, size, self.local.statements
+
+    def peak_rss_mb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def query_counts(self):
+        return None
+
+
+class HttpDriver:
+    """Real HTTP driver against a running server."""
+
+    def __init__(self, url, server_pid=None):
+        import requests
+        self.requests = requests
+        self.url = url.rstrip('/')
+        self.server_pid = server_pid
+
+    def session(self, username):
+        http = self.requests.Session()
+        page = http.get(f'{self.url}/login').text
+        token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+        http.post(f'{self.url}/login', data={'username': username, 'password': datagen.PASSWORD,
+                                             'csrf_token': token})
+        http.csrf_token = token
+        return http
+
+    def request(self, http, method, path, data):
+        if data is not None:
+            data = dict(data, csrf_token=http.csrf_token)
+        response = http.request(method, self.url + path, data=data, allow_redirects=False, stream=True)
+        size = sum(len(chunk) for chunk in response.iter_content(64 * 1024))
+        return response.status_code, size, None
+
+    def query_counts(self):
+        # {endpoint: (requests, statements)} from the server's /metrics
+        counts = defaultdict(lambda: [0, 0])
+        text = self.requests.get(f'{self.url}/metrics',
+                                 headers={'Authorization': f"Bearer {os.environ.get('METRICS_TOKEN', '')}"}).text
+        for line in text.splitlines():
+            match = re.match(r'(http_requests_total|db_statements_total)\{(.*)\} ([0-9.e+]+)$', line)
+            if not match:
+                continue
+            labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+            index = 0 if match.group(1) == 'http_requests_total' else 1
+            counts[labels['endpoint']][index] += float(match.group(3))
+        return counts
+
+    def peak_rss_mb(self):
+        # Sum of VmHWM over the gunicorn master and its workers, when we started it
+        if self.server_pid is None:
+            return None
+        pids = [self.server_pid]
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as f:
+                        if int(f.read().rsplit(')', 1)[1].split()[1]) == self.server_pid:
+                            pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        total_kb = 0
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    total_kb += next(int(line.split()[1]) for line in f if line.startswith('VmHWM'))
+            except (OSError, StopIteration):
+                continue
+        return total_kb / 1024
+
+
+def start_gunicorn(workers, port, env):
+    process = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                                'expense_tracker_app:create_app()'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import requests
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{port}/login', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def run_load(driver, usernames, mix, total_requests, concurrency, seed):
+    names, weights = zip(*mix.items())
+    results = defaultdict(lambda: {'latencies': [], 'statements': [], 'errors': 0, 'bytes': 0})
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def virtual_user(index):
+        rng = random.Random(seed + index)
+        session = driver.session(usernames[index % len(usernames)])
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = rng.choices(names, weights=weights)[0]
+            method, path, data = scenario_request(name, rng)
+            started = time.perf_counter()
+            try:
+                status, size, statements = driver.request(session, method, path, data)
+                failed = status >= 400
+            except Exception:
+                status, size, statements, failed = None, 0, None, True
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                result = results[name]
+                result['latencies'].append(elapsed_ms)
+                result['bytes'] += size
+                result['errors'] += failed
+                if statements is not None:
+                    result['statements'].append(statements)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['client', 'http'], default='client')
+    parser.add_argument('--url', default=None, help='server to load in http mode')
+    parser.add_argument('--start-gunicorn', type=int, metavar='WORKERS', default=None,
+                        help='start gunicorn with this many workers for http mode')
+    parser.add_argument('--database-url', default=None, help='defaults to a throwaway SQLite file')
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse existing bench* users')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--transactions', type=int, default=2000, help='transactions per user')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted scenario mix, e.g. dashboard=1,add_expense=1')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='loadtest-results.json')
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (part.split('=') for part in args.mix.split(','))}
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('MAIL_OUTBOX_MODE', 'worker')
+    os.environ.setdefault('METRICS_TOKEN', secrets.token_urlsafe(16))  # /metrics is off without one
+
+    if args.skip_seed:
+        usernames = [f'bench{i}' for i in range(args.users)]
+    else:
+        usernames = datagen.seed(args.users, args.transactions, seed_value=args.seed, destroy=args.destroy)
+
+    server = None
+    if args.mode == 'http':
+        url = args.url
+        if args.start_gunicorn:
+            port = 8765
+            server = start_gunicorn(args.start_gunicorn, port, dict(os.environ))
+            url = f'http://127.0.0.1:{port}'
+        if not url:
+            parser.error('--mode http needs --url or --start-gunicorn')
+        driver = HttpDriver(url, server.pid if server else None)
+    else:
+        driver = ClientDriver()
+
+    try:
+        before = driver.query_counts()
+        results, elapsed = run_load(driver, usernames, mix, args.requests, args.concurrency, args.seed)
+        after = driver.query_counts()
+        peak_rss = driver.peak_rss_mb()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+        'elapsed_seconds': elapsed,
+        'throughput_rps': sum(len(r['latencies']) for r in results.values()) / elapsed,
+        'peak_rss_mb': peak_rss,
+        'scenarios': {},
+    }
+    print(f"{'scenario':>17} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries/req':>11}")
+    for name in ENDPOINTS:
+        if name not in results:
+            continue
+        result = results[name]
+        queries = None
+        if result['statements']:
+            queries = sum(result['statements']) / len(result['statements'])
+        elif before is not None and after is not None:
+            requests_delta = after[name][0] - before[name][0]
+            if requests_delta:
+                queries = (after[name][1] - before[name][1]) / requests_delta
+        summary = {
+            'count': len(result['latencies']),
+            'errors': result['errors'],
+            'p50_ms': percentile(result['latencies'], 50),
+            'p95_ms': percentile(result['latencies'], 95),
+            'p99_ms': percentile(result['latencies'], 99),
+            'queries_per_request': queries,
+            'mean_response_bytes': result['bytes'] / max(1, len(result['latencies'])),
+        }
+        report['scenarios'][name] = summary
+        print(f"{name:>17} {summary['count']:>6} {summary['errors']:>6} {summary['p50_ms']:>8.1f} "
+              f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} "
+              f"{'-' if queries is None else f'{queries:.1f}':>11}")
+    print(f"throughput {report['throughput_rps']:.1f} req/s, peak RSS "
+          f"{'-' if peak_rss is None else f'{peak_rss:.0f} MB'}")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
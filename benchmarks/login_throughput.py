@@ -0,0 +1,108 @@
+"""Login throughput benchmark with concurrent users.
+
+Starts the app on a local threaded server (once hashing on the request
+thread, once on the process pool) and has --concurrency clients log in
+repeatedly while a probe client measures the latency of a cheap page.
+Reports logins/sec, probe latency percentiles and how many logins were
+shed with 503.
+
+Usage:
+    python -m benchmarks.login_throughput [--concurrency 16] [--seconds 10] [--workers 0,4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(concurrency, seconds):
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+    from expense_tracker_app import app, db, User, hash_password
+    logging.disable(logging.CRITICAL)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        password_hash = hash_password('benchmark-password')
+        db.session.add_all(User(username=f'user{i}', email=f'user{i}@example.com', password_hash=password_hash,
+                                currency='USD') for i in range(concurrency))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    deadline = time.perf_counter() + seconds
+    logins, shed, probe_latencies = [], [], []
+
+    def client(i):
+        with requests.Session() as http:
+            while time.perf_counter() < deadline:
+                response = http.post(f'{base_url}/login', allow_redirects=False,
+                                     data={'username': f'user{i}', 'password': 'benchmark-password'})
+                if response.status_code == 503:
+                    shed.append(response.status_code)
+                    time.sleep(0.1)  # back off like a client honouring Retry-After
+                else:
+                    logins.append(response.status_code)
+
+    def probe():
+        with requests.Session() as http:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                http.get(f'{base_url}/login')
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.05)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    print(json.dumps({'logins_per_sec': len(logins) / seconds, 'shed': len(shed),
+                      'probe_p50_ms': statistics.median(probe_latencies) if probe_latencies else float('nan'),
+                      'probe_p95_ms': percentile(probe_latencies, 95)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', default=f'0,{os.cpu_count() or 1}', help='PASSWORD_HASH_WORKERS values to compare')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run(args.concurrency, args.seconds)
+
+    print(f"{'hash workers':>12} {'logins/sec':>11} {'shed (503)':>11} {'probe p50 ms':>13} {'probe p95 ms':>13}")
+    for workers in args.workers.split(','):
+        env = dict(os.environ, PASSWORD_HASH_WORKERS=workers,
+                   DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db'))
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.login_throughput', '--child',
+                                 '--concurrency', str(args.concurrency), '--seconds', str(args.seconds)],
+                                cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{workers:>12} {result['logins_per_sec']:>11.1f} {result['shed']:>11} "
+              f"{result['probe_p50_ms']:>13.1f} {result['probe_p95_ms']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
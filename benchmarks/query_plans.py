@@ -0,0 +1,159 @@
+"""Query-plan regression benchmark for the hot report queries.
+
+Seeds large expense/income/exchange_rate tables (and their rollups), runs the
+app's own read paths behind dashboard, financial_report, the year choices,
+export_expenses and rate conversion (get_ledger_page, get_period_totals,
+get_rollup_totals, get_user_years, iter_transactions, RateSnapshot.load),
+captures every statement they send and checks that each is served from an
+index instead of a full table scan.
+
+Usage:
+    python -m benchmarks.query_plans [--rows 200000] [--database-url URL [--destroy]]
+
+Without --database-url a throwaway SQLite file is used. Pass a Postgres URL
+(e.g. postgresql://postgres@localhost/expense_bench) to check Postgres plans;
+its tables are dropped before and after the run, so a database that already
+holds rows needs --destroy. Exits non-zero if any query falls back to a
+sequential scan.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.datagen import reset_database  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help='rows per transaction table')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    return parser.parse_args()
+
+
+def seed(db, Expense, Income, ExchangeRate, rows, users):
+    rng = random.Random(42)
+    start = datetime(2015, 1, 1)
+    span = (datetime(2026, 1, 1) - start).days
+    currencies = ['USD', 'EUR', 'GBP', 'NGN']
+    batch = 10000
+    for model in (Expense, Income):
+        for offset in range(0, rows, batch):
+            db.session.execute(model.__table__.insert(), [
+                {
+                    'user_id': rng.randint(1, users),
+                    'amount': round(rng.uniform(1, 500), 2),
+                    'currency': rng.choice(currencies),
+                    'category': 'Other',
+                    'description': 'bench',
+                    'date': start + timedelta(days=rng.randrange(span)),
+                }
+                for _ in range(min(batch, rows - offset))
+            ])
+    db.session.execute(ExchangeRate.__table__.insert(), [
+        {'from_currency': 'USD', 'to_currency': c, 'rate': 1.0, 'timestamp': start + timedelta(days=d)}
+        for d in range(0, span, 7) for c in currencies
+    ])
+    db.session.commit()
+
+
+def hot_queries(app_module):
+    # The app functions behind each hot page, called for one user and month
+    m = app_module
+    user_id, currency = 1, 'USD'
+    start, end = datetime(2024, 3, 1), datetime(2024, 4, 1)
+
+    def user_years():
+        m.year_cache.delete(user_id)  # a cached answer sends no query
+        return m.get_user_years(user_id)
+
+    return {
+        'ledger page (dashboard/financial_report)': lambda: m.get_ledger_page(user_id, start, end),
+        'rollup totals (dashboard/financial_report)': lambda: m.get_rollup_totals(user_id, currency, 2024, 3),
+        'partial-period totals (financial_report)': lambda: m.get_period_totals(
+            user_id, currency, start + timedelta(days=3), end),
+        'year choices (get_user_years)': user_years,
+        'export stream (iter_transactions)': lambda: sum(1 for _ in m.iter_transactions(user_id, start, end)),
+        'latest rates (RateSnapshot.load)': m.RateSnapshot.load,
+    }
+
+
+def capture(db, function):
+    # Run function and return ([(statement, parameters)] it sent, elapsed seconds)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    db.event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', record)
+    return statements, elapsed
+
+
+def explain(db, statement, parameters):
+    dialect = db.engine.dialect
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.connection().exec_driver_sql(prefix + statement, parameters).all()
+    plan = '\n'.join(str(row[-1]) for row in rows)
+    if dialect.name == 'sqlite':
+        # SCAN of a subquery or co-routine (anon_1) walks rows already narrowed by an index
+        full_scan = any(line.split()[:2] == ['SCAN', table] and 'USING' not in line
+                        for line in plan.splitlines() for table in db.metadata.tables)
+    else:
+        full_scan = 'Seq Scan' in plan
+    return plan, full_scan
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RATE_REFRESH_MODE'] = 'worker'  # the seeded rates are old; never fetch mid-benchmark
+
+    import expense_tracker_app
+    from expense_tracker_app import app, db, Expense, Income, ExchangeRate, rebuild_rollups
+
+    failures = 0
+    with app.app_context():
+        reset_database(db, args.destroy)
+        started = time.perf_counter()
+        seed(db, Expense, Income, ExchangeRate, args.rows, args.users)
+        rebuild_rollups()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        print(f"Seeded {args.rows} rows per table on {db.engine.dialect.name} in {time.perf_counter() - started:.1f}s")
+
+        for name, function in hot_queries(expense_tracker_app).items():
+            statements, elapsed = capture(db, function)
+            print(f"{name} ({elapsed * 1000:.1f} ms, {len(statements)} statements)")
+            for statement, parameters in statements:
+                plan, full_scan = explain(db, statement, parameters)
+                status = 'FULL SCAN' if full_scan else 'ok'
+                print(f"  [{status:>9}] {' '.join(statement.split())[:100]}")
+                for line in plan.splitlines():
+                    print(f"              {line}")
+                failures += full_scan
+        db.session.remove()
+        db.drop_all()
+
+    if failures:
+        print(f"{failures} hot queries fell back to a full table scan")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark for recurring transaction rules.
+
+Seeds --users users with --rules rules each (monthly, weekly, fortnightly and
+daily, started up to --years years ago, a quarter of them in the future), then
+times:
+
+* projection: get_projected_entries for one user over the current month and
+  over the next --years years, with the SQL statements per call
+* materialization: materialize_due_rules inserting every due occurrence for
+  all users, against a per-occurrence ORM baseline (add, rollup update and
+  flush per row, as add_expense does) on a sample of the same rules
+
+Usage:
+    python -m benchmarks.recurring [--users 200] [--rules 20] [--years 5] [--repeat 20] [--database-url URL [--destroy]]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks import datagen  # noqa: E402
+
+INTERVALS = [('monthly', 1), ('weekly', 1), ('weekly', 2), ('daily', 1)]
+BASELINE_RULES = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rules', type=int, default=20, help='rules per user')
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'recurring.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['RECURRING_MODE'] = 'worker'  # projections must not start the materializer mid-benchmark
+    datagen.seed(args.users, 10, destroy=args.destroy)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from expense_tracker_app import (app, db, User, Expense, Income, RecurringRule, get_projected_entries,
+                                     materialize_due_rules, rule_occurrences, update_rollup, index_for_search)
+
+    statements = [0]
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def count_statement(*args):
+        statements[0] += 1
+
+    rng = random.Random(1)
+    now = datetime.utcnow() + timedelta(hours=1)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    with app.app_context():
+        users = db.session.query(User.id, User.currency).all()
+        for user_id, currency in users:
+            for _ in range(args.rules):
+                interval, every = rng.choice(INTERVALS)
+                start = today + timedelta(days=rng.randint(-365 * args.years, 120))
+                type = rng.choice(['Expense', 'Expense', 'Income'])
+                db.session.add(RecurringRule(
+                    user_id=user_id, type=type, amount=round(rng.uniform(5, 500), 2), currency=currency,
+                    category='Bills' if type == 'Expense' else 'Salary', description=f"{interval} {type.lower()}",
+                    interval=interval, every=every, start_date=start, next_date=start))
+        db.session.commit()
+        user_id = users[0][0]
+        month_start = today.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+        print(f"Projection for one user with {args.rules} rules:")
+        for label, start, end in (('this month', month_start, next_month),
+                                  (f'next {args.years} years', today, today + timedelta(days=365 * args.years))):
+            timings = []
+            for _ in range(args.repeat):
+                db.session.expire_all()
+                statements[0] = 0
+                started = time.perf_counter()
+                entries = get_projected_entries(user_id, start, end)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"  {label:>16}: {statistics.median(timings):8.2f} ms, {len(entries):6d} occurrences, "
+                  f"{statements[0]} SQL statements")
+
+        # Baseline on a sample: one ORM row, rollup update and flush per occurrence, then roll back
+        sample = RecurringRule.query.filter(RecurringRule.next_date < now).limit(BASELINE_RULES).all()
+        started = time.perf_counter()
+        baseline_rows = 0
+        for rule in sample:
+            model = Expense if rule.type == 'Expense' else Income
+            for date in rule_occurrences(rule, rule.next_date, now):
+                row = model(user_id=rule.user_id, amount=rule.amount, currency=rule.currency, category=rule.category,
+                            description=rule.description, date=date)
+                db.session.add(row)
+                db.session.flush()
+                index_for_search(model, rule.type, model.id == row.id)
+                update_rollup(rule.user_id, rule.type, date, rule.category, rule.currency, rule.amount)
+                baseline_rows += 1
+        baseline = time.perf_counter() - started
+        db.session.rollback()
+
+        statements[0] = 0
+        started = time.perf_counter()
+        inserted = materialize_due_rules(now)
+        elapsed = time.perf_counter() - started
+        print(f"Materialization of {args.users * args.rules} rules:")
+        print(f"  per-occurrence ORM ({len(sample)} rules): {baseline_rows:8d} rows in {baseline:6.2f}s, "
+              f"{baseline_rows / baseline:10.0f} rows/s")
+        print(f"  materialize_due_rules ({args.users} users): {inserted:8d} rows in {elapsed:6.2f}s, "
+              f"{inserted / elapsed:10.0f} rows/s, {statements[0]} SQL statements")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Mixed read/write concurrency benchmark for read-replica routing and SQLite pragmas.
+
+Seeds a primary database (see benchmarks.datagen), gives the replica the same
+data, then runs benchmarks.loadtest against each configuration in a fresh
+process and compares throughput, read/write latency and errors:
+
+* primary only, SQLite pragmas off (rollback journal; SQLite only)
+* primary only, with WAL and the other pragmas
+* primary for writes, replica for dashboard/report/export reads
+
+With SQLite files (the default) the replica is a copy of the primary taken
+after seeding. With PostgreSQL pass two instances; both are seeded with the
+same deterministic data. Replication itself is not set up, so the replica
+does not see writes made during the run, and READ_REPLICA_STICKY_SECONDS is
+0 so every read-only request can be routed.
+
+Usage:
+    python -m benchmarks.replica [--users 20] [--transactions 5000] [--requests 2000] [--concurrency 8]
+    python -m benchmarks.replica --database-url postgresql://localhost:5432/bench \\
+        --replica-url postgresql://localhost:5433/bench [--destroy]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from contextlib import closing
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MIX = 'dashboard=40,financial_report=25,export_expenses=5,add_expense=30'
+
+
+def sqlite_path(url):
+    return url[len('sqlite:///'):] if url.startswith('sqlite:///') else None
+
+
+def run(module, env, *args):
+    subprocess.run([sys.executable, '-m', module, *map(str, args)], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None, help='primary; defaults to a throwaway SQLite file')
+    parser.add_argument('--replica-url', default=None, help='replica; defaults to a copy of the SQLite primary')
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url/--replica-url even if they hold data')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--transactions', type=int, default=5000, help='transactions per user')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    primary = args.database_url or 'sqlite:///' + os.path.join(workdir, 'primary.db')
+    replica = args.replica_url or 'sqlite:///' + os.path.join(workdir, 'replica.db')
+    env = dict(os.environ, LOG_LEVEL='WARNING', PASSWORD_HASH_WORKERS='0', READ_REPLICA_STICKY_SECONDS='0')
+    env.pop('DATABASE_REPLICA_URL', None)
+
+    seed_args = ['--users', args.users, '--transactions', args.transactions, *(['--destroy'] if args.destroy else [])]
+    run('benchmarks.datagen', env, *seed_args, '--database-url', primary)
+    if sqlite_path(replica) and sqlite_path(primary) and not args.replica_url:
+        with closing(sqlite3.connect(sqlite_path(primary))) as source, \
+                closing(sqlite3.connect(sqlite_path(replica))) as target:
+            source.backup(target)
+    else:
+        run('benchmarks.datagen', env, *seed_args, '--database-url', replica)
+
+    configurations = []
+    if sqlite_path(primary):
+        configurations.append(('primary, no pragmas', dict(env, SQLITE_PRAGMAS='0')))
+    configurations.append(('primary', env))
+    configurations.append(('primary + replica', dict(env, DATABASE_REPLICA_URL=replica)))
+
+    print(f"{'configuration':>20} {'req/s':>8} {'read p95':>9} {'write p95':>10} {'errors':>7}")
+    for label, config_env in configurations:
+        if sqlite_path(primary):
+            # journal_mode is stored in the file, so reset it; the app re-enables WAL when pragmas are on
+            with closing(sqlite3.connect(sqlite_path(primary))) as connection:
+                connection.execute('PRAGMA journal_mode=DELETE')
+        output = os.path.join(workdir, 'result.json')
+        run('benchmarks.loadtest', config_env, '--skip-seed', '--database-url', primary, '--users', args.users,
+            '--requests', args.requests, '--concurrency', args.concurrency, '--mix', MIX, '--output', output)
+        with open(output) as f:
+            result = json.load(f)
+        scenarios = result['scenarios']
+        reads = [scenarios[name]['p95_ms'] for name in ('dashboard', 'financial_report', 'export_expenses')
+                 if name in scenarios]
+        write = scenarios.get('add_expense', {}).get('p95_ms')
+        errors = sum(s['errors'] for s in scenarios.values())
+        print(f"{label:>20} {result['throughput_rps']:>8.1f} {max(reads):>8.1f}ms "
+              f"{'-' if write is None else f'{write:.1f}ms':>10} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Latency benchmark for full-text transaction search.
+
+Bulk-loads --rows expenses with Zipf-distributed multi-word descriptions
+spread over --users users, builds the search index (the FTS5 table on SQLite;
+PostgreSQL maintains its GIN indexes during the load) and times
+search_transactions for random users with common, rare and two-word terms,
+with and without amount/date filters. Prints p50/p95/max per query shape
+against the 50 ms target.
+
+Usage:
+    python -m benchmarks.search [--rows 10000000] [--users 1000] [--queries 200] [--database-url URL [--skip-load | --destroy]]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.datagen import reset_database  # noqa: E402
+
+COMMON = ['coffee', 'lunch', 'groceries', 'uber', 'rent', 'netflix', 'fuel', 'pharmacy', 'dinner', 'taxi',
+          'electricity', 'internet', 'gym', 'books', 'cinema', 'bakery', 'market', 'parking', 'airtime', 'pizza']
+TARGET_MS = 50
+
+
+def vocabulary(size):
+    return COMMON + [f"merchant{i}" for i in range(size - len(COMMON))]
+
+
+def generate_rows(rng, words, weights, user_ids, count, start):
+    for _ in range(count):
+        yield {
+            'user_id': rng.choice(user_ids),
+            'amount': round(rng.lognormvariate(3, 1), 2),
+            'currency': 'USD',
+            'category': rng.choice(['Food', 'Transport', 'Entertainment', 'Bills', 'Other']),
+            'description': ' '.join(rng.choices(words, weights=weights, k=rng.randint(2, 5))),
+            'date': start + timedelta(days=rng.randrange(3650)),
+        }
+
+
+def load(args, rng, words, weights, start):
+    from expense_tracker_app import db, User, Expense, rebuild_search_index
+
+    reset_database(db, args.destroy)
+    db.session.add_all(User(username=f"search{i}", email=f"search{i}@example.com", password_hash='x',
+                            currency='USD') for i in range(args.users))
+    db.session.commit()
+    user_ids = [user_id for user_id, in db.session.query(User.id)]
+
+    started = time.perf_counter()
+    rows = generate_rows(rng, words, weights, user_ids, args.rows, start)
+    loaded = 0
+    while loaded < args.rows:
+        batch = [row for _, row in zip(range(50000), rows)]
+        db.session.execute(Expense.__table__.insert(), batch)
+        db.session.commit()
+        loaded += len(batch)
+    print(f"Loaded {loaded} rows in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    indexed = rebuild_search_index()
+    if indexed is not None:
+        print(f"Indexed {indexed} descriptions in {time.perf_counter() - started:.1f}s")
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=200, help='queries per shape')
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    parser.add_argument('--skip-load', action='store_true', help='reuse the rows already in --database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from expense_tracker_app import app, db, User, search_transactions
+
+    rng = random.Random(1)
+    words = vocabulary(args.vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3650)
+
+    with app.app_context():
+        if args.skip_load:
+            user_ids = [user_id for user_id, in db.session.query(User.id)]
+        else:
+            user_ids = load(args, rng, words, weights, start)
+        mid = start + timedelta(days=1825)
+        shapes = {
+            'common word': lambda: dict(text=rng.choice(COMMON[:5])),
+            'rare word': lambda: dict(text=rng.choice(words[len(words) // 2:])),
+            'two words': lambda: dict(text=' '.join(rng.sample(COMMON, 2))),
+            'word + filters': lambda: dict(text=rng.choice(COMMON), min_amount=10, max_amount=200,
+                                           start_date=mid, end_date=mid + timedelta(days=365)),
+            'filters only': lambda: dict(category='Food', start_date=mid, end_date=mid + timedelta(days=90)),
+            'page 5': lambda: dict(text=rng.choice(COMMON[:5]), page=5),
+        }
+        print(f"{'query':>16} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'results':>8}")
+        for label, make_query in shapes.items():
+            timings, counts = [], []
+            for _ in range(args.queries):
+                query = make_query()
+                started = time.perf_counter()
+                page = search_transactions(rng.choice(user_ids), **query)
+                timings.append((time.perf_counter() - started) * 1000)
+                counts.append(len(page.entries))
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            print(f"{label:>16} {statistics.median(timings):>8.1f} {p95:>8.1f} {max(timings):>8.1f} "
+                  f"{statistics.mean(counts):>8.1f} {'ok' if p95 < TARGET_MS else 'SLOW'}")
+
+
+if __name__ == '__main__':
+    main()
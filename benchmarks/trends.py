@@ -0,0 +1,102 @@
+"""Benchmark for the /api/trends aggregation.
+
+Seeds one user with --transactions rows spread over --years years (see
+benchmarks.datagen), then times the full-range trends computation three ways:
+
+* build_trends: rollup columns in one query, bucketed with NumPy bincount
+* raw columns: every Expense/Income row in one query, bucketed the same way
+* per-month loop: one get_period_totals call per month (the pre-trends approach)
+
+and prints the median time and SQL statements per run.
+
+Usage:
+    python -m benchmarks.trends [--transactions 100000] [--years 10] [--repeat 5] [--database-url URL [--destroy]]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks import datagen  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--destroy', action='store_true', help='drop --database-url even if it holds data')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trends.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    username, = datagen.seed(1, args.transactions, years=args.years, foreign_share=0, destroy=args.destroy)  # raw columns skip conversion
+
+    import numpy as np
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from expense_tracker_app import (app, db, User, Expense, Income, build_trends, get_period_totals,
+                                     month_index)
+
+    statements = [0]
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def count_statement(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        now = datetime.utcnow()
+        months = args.years * 12 + 1
+        last = month_index(now)
+        first = last - months + 1
+        start = datetime(first // 12, first % 12 + 1, 1)
+
+        def rollup_columns():
+            return build_trends(user.id, user.currency, start, months)
+
+        def raw_columns():
+            # Same bucketing over raw rows, all in the user's currency
+            series = []
+            for model in (Expense, Income):
+                rows = db.session.query(db.extract('year', model.date), db.extract('month', model.date),
+                                        model.amount).filter(model.user_id == user.id, model.date >= start).all()
+                years, month_numbers, amounts = (np.asarray(column, dtype=float) for column in zip(*rows))
+                offsets = (years * 12 + month_numbers - 1 - first).astype(np.int64)
+                series.append(np.bincount(offsets, weights=amounts, minlength=months))
+            return series
+
+        def per_month():
+            totals = []
+            for index in range(first, last + 1):
+                month_start = datetime(index // 12, index % 12 + 1, 1)
+                month_end = datetime((index + 1) // 12, (index + 1) % 12 + 1, 1)
+                totals.append(get_period_totals(user.id, user.currency, month_start, month_end))
+            return totals
+
+        trends = rollup_columns()
+        raw_expense, raw_income = raw_columns()
+        assert np.allclose(trends['expense']['values'], np.round(raw_expense, 2), atol=0.02)
+        assert np.allclose(trends['income']['values'], np.round(raw_income, 2), atol=0.02)
+
+        print(f"{args.transactions} transactions over {months} months on {db.engine.dialect.name}")
+        for label, function in (('build_trends', rollup_columns), ('raw columns', raw_columns),
+                                ('per-month loop', per_month)):
+            timings = []
+            for _ in range(args.repeat):
+                db.session.expire_all()
+                statements[0] = 0
+                started = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - started)
+            print(f"{label:>16}: {statistics.median(timings) * 1000:8.1f} ms median, {statements[0]} statements")
+
+
+if __name__ == '__main__':
+    main()
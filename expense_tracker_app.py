@@ -1,47 +1,137 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, Response
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, Response, jsonify, stream_with_context, session, g, make_response, has_request_context, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from sqlalchemy import event, DDL, MetaData, Table
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_mail import Mail, Message
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, FloatField, SelectField, EmailField, DateField
-from wtforms.validators import DataRequired, NumberRange, Email, Length
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, PasswordField, FloatField, SelectField, EmailField, DateField, IntegerField
+from wtforms.validators import DataRequired, NumberRange, Email, Length, Optional, ValidationError
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.local import LocalProxy
 from itsdangerous import URLSafeTimedSerializer
 from datetime import datetime, timedelta
+from collections import namedtuple, Counter, defaultdict
+from functools import lru_cache, wraps
+import bisect
+import calendar
 import csv
+import hashlib
+import heapq
+import hmac
+import click
 from io import StringIO
+import io
+import itertools
+import json
 import os
-import requests
+import pickle
+import random
+import re
+import socket
+import sqlite3
+import smtplib
+import threading
+import time
+import weakref
+import zlib
 from cachetools import TTLCache
 import logging  # Added for debugging
 from dotenv import load_dotenv
+from urllib.parse import urlsplit, unquote
 import os
 
-# Load environment variables from .env
-load_dotenv()
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# numpy, requests, flask_mail and Flask-Migrate are imported where first used, so importing this module and
+# booting a worker stays cheap; warm_up() loads them once in a preloading parent instead
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-# Load configuration from environment variables for render
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret-key')
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['EXCHANGE_RATE_API_KEY'] = os.getenv('EXCHANGE_RATE_API_KEY', 'fallback-api-key')
+def load_config(app, overrides=None):
+    # Configuration from environment variables for render; `overrides` win, and the engine options
+    # derived from the database URLs are computed after them
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret-key')
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', '1') == '1'
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['EXCHANGE_RATE_API_KEY'] = os.getenv('EXCHANGE_RATE_API_KEY', 'fallback-api-key')
+    app.config['EXCHANGE_RATE_API_URL'] = os.getenv('EXCHANGE_RATE_API_URL', 'https://v6.exchangerate-api.com/v6')  # Or a local stand-in
+    app.config['EXCHANGE_RATE_API_TIMEOUT'] = float(os.getenv('EXCHANGE_RATE_API_TIMEOUT', 5))  # Seconds, connect and read
+    # 'thread' refreshes stale rates from a background thread in the worker that notices first (requests keep the
+    # last known rates meanwhile); 'worker' leaves it to `flask refresh-rates --loop` or cron
+    app.config['RATE_REFRESH_MODE'] = os.getenv('RATE_REFRESH_MODE', 'thread')
+    # Currency changes touching more rows than this run in the background, CHUNK_SIZE rows per commit
+    app.config['CURRENCY_CONVERSION_BACKGROUND_THRESHOLD'] = int(os.getenv('CURRENCY_CONVERSION_BACKGROUND_THRESHOLD', 50000))
+    app.config['CURRENCY_CONVERSION_CHUNK_SIZE'] = int(os.getenv('CURRENCY_CONVERSION_CHUNK_SIZE', 5000))
+    app.config['LEDGER_PAGE_SIZE'] = int(os.getenv('LEDGER_PAGE_SIZE', 50))  # Transactions per dashboard/report page
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 1800))  # Keep below WTF_CSRF_TIME_LIMIT (3600s)
+    app.config['TRENDS_MAX_MONTHS'] = int(os.getenv('TRENDS_MAX_MONTHS', 240))  # Longest range /api/trends returns
+    app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', 5000))  # Rows validated and inserted per commit
+    app.config['IMPORT_USE_COPY'] = os.getenv('IMPORT_USE_COPY', '1') == '1'  # COPY FROM STDIN on PostgreSQL
+    # 'thread' materializes due recurring transactions from a background thread in the worker that notices them first
+    # (pages show them as projected meanwhile); 'worker' leaves it to `flask materialize-recurring --loop` or cron
+    app.config['RECURRING_MODE'] = os.getenv('RECURRING_MODE', 'thread')
+    app.config['RECURRING_BATCH_SIZE'] = int(os.getenv('RECURRING_BATCH_SIZE', 500))  # Rules materialized per commit
+    app.config['RECURRING_POLL_INTERVAL'] = int(os.getenv('RECURRING_POLL_INTERVAL', 3600))  # Seconds, for --loop
+    # 'thread' delivers queued mail from a background thread in each worker; 'worker' leaves it to `flask send-mail --loop`
+    app.config['MAIL_OUTBOX_MODE'] = os.getenv('MAIL_OUTBOX_MODE', 'thread')
+    app.config['MAIL_OUTBOX_BATCH_SIZE'] = int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50))  # Messages per SMTP connection
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    app.config['MAIL_OUTBOX_RETRY_DELAY'] = int(os.getenv('MAIL_OUTBOX_RETRY_DELAY', 30))  # Seconds, doubled per attempt
+    app.config['MAIL_OUTBOX_POLL_INTERVAL'] = int(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 30))
+    # Percentages of a monthly budget at which an alert mail is queued, once per level per month
+    app.config['BUDGET_ALERT_LEVELS'] = [int(level) for level in os.getenv('BUDGET_ALERT_LEVELS', '80,100').split(',')]
+    # Werkzeug method string; existing hashes are upgraded on the next successful login when this changes
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Processes used for password hashing in each web worker (0 hashes on the request thread), and how many
+    # hashes may be queued or running before sign-in requests get a 503. Every gunicorn worker has its own pool,
+    # so the default shares the cores between the WEB_CONCURRENCY workers instead of giving each one all of them
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv(
+        'PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 1) // int(os.getenv('WEB_CONCURRENCY', 1)))))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv(
+        'PASSWORD_HASH_MAX_PENDING', 4 * max(1, app.config['PASSWORD_HASH_WORKERS'])))
+    app.config['PASSWORD_HASH_TIMEOUT'] = int(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    # Per-worker cache of logged-in users; other workers' copies may lag by up to USER_CACHE_TTL seconds
+    # for changes made outside the user's own session (e.g. background currency conversions)
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 10000))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    # Backend for the exchange-rate and per-user caches: memory:// (per worker), sqlite:////path/cache.db (shared
+    # by the workers on one host) or redis://host:6379/0 (shared across hosts)
+    app.config['CACHE_URL'] = os.getenv('CACHE_URL', 'memory://')
+    app.config['CACHE_TIMEOUT'] = float(os.getenv('CACHE_TIMEOUT', 0.5))  # Seconds; a slow shared cache counts as a miss
+    app.config['CACHE_RETRY_AFTER'] = float(os.getenv('CACHE_RETRY_AFTER', 5))  # Seconds to skip an unreachable Redis
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # /metrics requires 'Authorization: Bearer <token>'; off while unset
+
+    # Database config
+    db_url = os.getenv('DATABASE_URL')
+    if db_url and db_url.startswith("postgres://"):
+        # Render gives old scheme sometimes, fix it
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
 
-# Database config
-db_url = os.getenv('DATABASE_URL')
-if db_url and db_url.startswith("postgres://"):
-    # Render gives old scheme sometimes, fix it
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_url or 'sqlite:///expenses.db'
 
-app.config['SQLALCHEMY_DATABASE_URI'] = db_url or 'sqlite:///expenses.db'
+    # Optional read replica for the dashboard, reports and exports; writes always go to DATABASE_URL
+    replica_url = os.getenv('DATABASE_REPLICA_URL')
+    if replica_url and replica_url.startswith("postgres://"):
+        replica_url = replica_url.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_BINDS'] = {'replica': replica_url} if replica_url else {}
+    # After a write, that user's reads stay on the primary this long so they see their own changes
+    app.config['READ_REPLICA_STICKY_SECONDS'] = float(os.getenv('READ_REPLICA_STICKY_SECONDS', 5))
+    app.config['SQLITE_PRAGMAS'] = os.getenv('SQLITE_PRAGMAS', '1') == '1'  # WAL and friends on SQLite files
+    app.config.update(overrides or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # Seconds; below typical server idle timeouts
+    }
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),  # Per worker process, for each of primary and replica
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        )
 
 # app.config['SECRET_KEY'] = 'your-secret-key'  # Replace with a secure key
 # app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///expenses.db'
@@ -52,17 +142,338 @@ app.config['SQLALCHEMY_DATABASE_URI'] = db_url or 'sqlite:///expenses.db'
 # app.config['MAIL_USERNAME'] = 'email@gmail.com'  # Replace with your Gmail address
 # app.config['MAIL_PASSWORD'] = 'random'  # Replace with your 16-character app-specific-password
 # app.config['EXCHANGE_RATE_API_KEY'] = 'apikey'  # Replace with your exchangerate-api.com API key
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-mail = Mail(app)
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends SELECTs to the replica engine inside read-only views. Writes, locking reads, reads of models marked
+    `__read_from_primary__` and everything after the view's first write use the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('use_read_replica') and 'replica' in self._db.engines:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.use_read_replica = False  # the view wrote, so the rest of it reads its own writes from the primary
+            elif (getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+                  and not getattr(getattr(mapper, 'class_', None), '__read_from_primary__', False)):
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def include_in_autogenerate(object, name, type_, reflected, compare_to):
+    # The SQLite FTS5 search table (and its shadow tables) and the PostgreSQL GIN search indexes are created
+    # outside the models; without this, `flask db migrate` would generate drops for them
+    if reflected and compare_to is None and name:
+        return not (type_ == 'table' and name.startswith('transaction_search')
+                    or type_ == 'index' and name.endswith('_description_search'))
+    return True
+
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'])
-cache = TTLCache(maxsize=100, ttl=604800)  # Cache exchange rates for 7 days
+login_manager.login_view = 'main.login'
+bp = Blueprint('main', __name__, cli_group=None)  # Routes, hooks and CLI commands, registered by create_app()
+
+def get_mail():
+    # Flask-Mail is only needed by the outbox sender, so it is imported and set up on the first delivery
+    state = current_app.extensions['expense_tracker']
+    if state.get('mail') is None:
+        from flask_mail import Mail
+        state['mail'] = Mail(current_app)
+    return state['mail']
+
+class CacheBackend:
+    """Namespaced key/value cache with a TTL. Shared backends pickle values and treat any error as a miss."""
+
+    name = None
+
+    def __init__(self, namespace, ttl):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def key(self, key):
+        return f"expense_tracker:{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            data = self.load(self.key(key))
+            return default if data is None else pickle.loads(data)
+        except Exception as e:
+            self.failed('get', e)
+            return default
+
+    def set(self, key, value):
+        try:
+            self.store(self.key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.ttl)
+        except Exception as e:
+            self.failed('set', e)
+
+    def update(self, key, function):
+        # Atomic read-modify-write: function gets the cached value (None when missing) and returns the new one,
+        # or None to leave the entry as it is
+        def change(data):
+            value = function(None if data is None else pickle.loads(data))
+            return None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        try:
+            self.modify(self.key(key), change)
+        except Exception as e:
+            self.failed('update', e)
+
+    def delete(self, key):
+        try:
+            self.remove(self.key(key))
+        except Exception as e:
+            self.failed('delete', e)
+
+    def failed(self, operation, error):
+        metrics.inc('cache_backend_errors_total', backend=self.name, operation=operation)
+        logger.warning(f"{self.name} cache {operation} failed: {str(error)}")
+
+class MemoryCache(CacheBackend):
+    # Per-process TTLCache; values are stored as-is, and getsizeof (if given) bounds the total size instead of the count
+    name = 'memory'
+
+    def __init__(self, namespace, ttl, maxsize=1000, getsizeof=None):
+        super().__init__(namespace, ttl)
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl, getsizeof=getsizeof)
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.entries.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            try:
+                self.entries[key] = value
+            except ValueError:
+                pass  # larger than the whole cache
+
+    def update(self, key, function):
+        with self.lock:
+            value = function(self.entries.get(key))
+            if value is not None:
+                self.entries[key] = value
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class SQLiteCache(CacheBackend):
+    # Memory-mapped SQLite file shared by all workers on one host; one connection per thread and process
+    name = 'sqlite'
+
+    def __init__(self, namespace, ttl, path, timeout):
+        super().__init__(namespace, ttl)
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA mmap_size=67108864')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_entry '
+                               '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)')
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def load(self, key):
+        row = self.connection().execute('SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?',
+                                        (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def store(self, key, data, ttl):
+        connection = self.connection()
+        now = time.time()
+        connection.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                           (key, data, now + ttl))
+        if hash(key) % 100 == int(now) % 100:
+            connection.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now,))  # occasional purge
+
+    def modify(self, key, function):
+        # BEGIN IMMEDIATE takes the write lock up front, so no other writer slips in between the read and the write
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            data = function(self.load(key))
+            if data is not None:
+                self.store(key, data, self.ttl)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def remove(self, key):
+        self.connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def clear(self):
+        self.connection().execute("DELETE FROM cache_entry WHERE key LIKE ? ESCAPE '\\'",
+                                  (self.key('').replace('_', '\\_') + '%',))
+
+class RedisCache(CacheBackend):
+    # Speaks the Redis protocol (RESP) directly, so any Redis-compatible server works without extra packages
+    name = 'redis'
+
+    def __init__(self, namespace, ttl, url, timeout, retry_after):
+        super().__init__(namespace, ttl)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.retry_at = 0.0  # monotonic time before which every thread skips the server after a connection failure
+        parts = urlsplit(url)
+        self.address = (parts.hostname or 'localhost', parts.port or 6379)
+        self.password = unquote(parts.password) if parts.password else None
+        self.database = int(parts.path.strip('/') or 0)
+        self.local = threading.local()
+
+    def command(self, *args):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.sock = None  # never share a connection with the parent after a fork
+            self.local.pid = os.getpid()
+        if self.local.sock is None:
+            # During an outage fail at once instead of waiting out a connect timeout on every cache call
+            if time.monotonic() < self.retry_at:
+                raise ConnectionError('cache server unreachable, retrying shortly')
+            try:
+                sock = socket.create_connection(self.address, timeout=self.timeout)
+            except OSError:
+                self.retry_at = time.monotonic() + self.retry_after
+                raise
+            self.local.sock, self.local.reader = sock, sock.makefile('rb')
+            if self.password:
+                self.command('AUTH', self.password)
+            if self.database:
+                self.command('SELECT', self.database)
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(arg)}\r\n".encode() + arg + b"\r\n")
+        try:
+            self.local.sock.sendall(b''.join(parts))
+            return self.read_reply()
+        except OSError:
+            self.local.sock.close()
+            self.local.sock = None
+            self.retry_at = time.monotonic() + self.retry_after
+            raise
+
+    def read_reply(self):
+        line = self.local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('connection closed by cache server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            return None if int(payload) < 0 else self.local.reader.read(int(payload) + 2)[:-2]
+        if kind == b'*':
+            return None if int(payload) < 0 else [self.read_reply() for _ in range(int(payload))]
+        raise ConnectionError(f"unexpected reply from cache server: {line!r}")
+
+    def load(self, key):
+        return self.command('GET', key)
+
+    def store(self, key, data, ttl):
+        self.command('SET', key, data, 'PX', int(ttl * 1000))
+
+    def modify(self, key, function):
+        # Optimistic transaction: EXEC does nothing if another client wrote the key after WATCH, so read again and retry
+        for attempt in range(10):
+            if attempt:
+                time.sleep(random.uniform(0, 0.002 * attempt))  # spread out writers that keep colliding
+            self.command('WATCH', key)
+            try:
+                data = function(self.command('GET', key))
+            except Exception:
+                self.command('UNWATCH')
+                raise
+            if data is None:
+                self.command('UNWATCH')
+                return
+            self.command('MULTI')
+            self.command('SET', key, data, 'PX', int(self.ttl * 1000))
+            if self.command('EXEC') is not None:
+                return
+        self.command('DEL', key)  # still contended: drop the entry, the next read rebuilds it
+
+    def remove(self, key):
+        self.command('DEL', key)
+
+    def clear(self):
+        cursor = '0'
+        while True:
+            cursor, keys = self.command('SCAN', cursor, 'MATCH', self.key('*'), 'COUNT', 1000)
+            if keys:
+                self.command('DEL', *keys)
+            cursor = cursor.decode()
+            if cursor == '0':
+                break
+
+def make_cache(config, namespace, ttl, maxsize=1000, getsizeof=None):
+    # maxsize and getsizeof bound the per-process memory cache; shared backends rely on the TTL instead
+    url = config['CACHE_URL']
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(namespace, ttl, url[len('sqlite:///'):], config['CACHE_TIMEOUT'])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisCache(namespace, ttl, url, config['CACHE_TIMEOUT'], config['CACHE_RETRY_AFTER'])
+    return MemoryCache(namespace, ttl, maxsize, getsizeof)
+
+def init_app_state(app):
+    # Caches and limits sized from the app's config, one set per app; the module-level names below proxy to
+    # the current app's set
+    config = app.config
+    app.extensions['expense_tracker'] = {
+        'cache': make_cache(config, 'rates', ttl=604800),
+        'year_cache': make_cache(config, 'years', ttl=300, maxsize=10000),
+        'response_cache': make_cache(config, 'responses', ttl=config['RESPONSE_CACHE_TTL'],
+                                     maxsize=config['RESPONSE_CACHE_MAX_BYTES'], getsizeof=len),
+        'user_cache': make_cache(config, 'users', ttl=config['USER_CACHE_TTL'], maxsize=config['USER_CACHE_SIZE']),
+        'password_hash_slots': threading.BoundedSemaphore(config['PASSWORD_HASH_MAX_PENDING']),
+        'serializer': URLSafeTimedSerializer(config['SECRET_KEY']),
+        'mail': None,
+        # Background threads run against the app that started them, so each app keeps its own
+        'outbox_sender': None,  # Mail thread, started on first use
+        'outbox_wakeup': threading.Event(),
+        'rate_refresher': None,  # Exchange-rate refresh thread, started when rates go stale
+        'recurring_materializer': None,  # Recurring-transaction thread, started when rules fall due
+        'recurring_materializer_started': None,  # time.monotonic() of the last start, to spare the lease table
+    }
+
+def app_state(name):
+    return LocalProxy(lambda: current_app.extensions['expense_tracker'][name])
+
+cache = app_state('cache')  # Exchange-rate snapshot and timeline, kept for 7 days
+rate_snapshot_lock = threading.Lock()
+year_cache = app_state('year_cache')  # Distinct transaction years per user
+response_cache = app_state('response_cache')  # Rendered pages; bounded by bytes when kept in memory
+response_cache_stats = Counter()
+password_hash_executor = None  # (pid, ProcessPoolExecutor)
+user_cache = app_state('user_cache')  # CachedUser by id
+user_cache_stats = Counter()  # each hit is one user query saved
+password_hash_lock = threading.Lock()
+password_hash_slots = app_state('password_hash_slots')  # Bounds hashes queued for the pool
+serializer = app_state('serializer')  # Signs password-reset tokens
+outbox_sender_lock = threading.Lock()
+rate_refresher_lock = threading.Lock()
+recurring_materializer_lock = threading.Lock()
+exchange_rate_session = None  # (pid, requests.Session), reusing connections to the rates API
+exchange_rate_session_lock = threading.Lock()
 
 SUPPORTED_CURRENCIES = ['USD', 'EUR', 'GBP', 'NGN']
 BASE_CURRENCY = 'USD'
+RATE_SNAPSHOT_KEY = 'rate_snapshot'
+RATE_TIMELINE_KEY = 'rate_timeline'
+RATE_MAX_AGE = timedelta(days=7)
+RATE_RETRY_INTERVAL = timedelta(minutes=5)  # How long a stale snapshot is served before probing again
+RATE_REFRESH_LEASE = timedelta(minutes=5)  # One API fetch per expiry across workers; also spaces out retries
+MAIL_OUTBOX_LEASE = timedelta(minutes=5)  # How long a claimed message is hidden from other senders
+RECURRING_LEASE = timedelta(minutes=10)  # One materializer run per lease across workers
+CURRENCY_CONVERSION_LEASE = timedelta(minutes=5)  # A running job without a heartbeat this long is resumed elsewhere
 
 # WTForms (unchanged)
 class RegisterForm(FlaskForm):
@@ -104,6 +515,10 @@ class UpdateCurrencyForm(FlaskForm):
                                                ('GBP', 'British Pound (GBP)'), ('NGN', 'Nigerian Naira (NGN)')], 
                           validators=[DataRequired()])
 
+class ImportForm(FlaskForm):
+    file = FileField('File', validators=[FileRequired()])
+    format = SelectField('Format', choices=[('csv', 'CSV'), ('json', 'JSON / JSON Lines')], validators=[DataRequired()])
+
 class PeriodForm(FlaskForm):
     month = SelectField('Month', choices=[
         ('All', 'All'), ('1', 'January'), ('2', 'February'), ('3', 'March'), 
@@ -113,6 +528,51 @@ class PeriodForm(FlaskForm):
     ], validators=[DataRequired()])
     year = SelectField('Year', choices=[], validators=[DataRequired()])
 
+class SearchForm(FlaskForm):
+    class Meta:
+        csrf = False  # read-only GET form
+
+    q = StringField('Search', validators=[Length(max=200)])
+    type = SelectField('Type', choices=[('', 'All'), ('Expense', 'Expenses'), ('Income', 'Incomes')], default='')
+    category = StringField('Category', validators=[Length(max=50)])
+    min_amount = FloatField('Min amount', validators=[Optional()])
+    max_amount = FloatField('Max amount', validators=[Optional()])
+    start = DateField('From', validators=[Optional()])
+    end = DateField('To', validators=[Optional()])
+
+class BudgetForm(FlaskForm):
+    category = SelectField('Category', choices=[('Food', 'Food'), ('Transport', 'Transport'),
+                                               ('Entertainment', 'Entertainment'), ('Bills', 'Bills'),
+                                               ('Other', 'Other')], validators=[DataRequired()])
+    amount = FloatField('Monthly budget', validators=[DataRequired(), NumberRange(min=0.01)])
+
+class RecurringRuleForm(FlaskForm):
+    type = SelectField('Type', choices=[('Expense', 'Expense'), ('Income', 'Income')], validators=[DataRequired()])
+    amount = FloatField('Amount', validators=[DataRequired(), NumberRange(min=0.01)])
+    currency = SelectField('Currency', choices=[('USD', 'US Dollar (USD)'), ('EUR', 'Euro (EUR)'),
+                                               ('GBP', 'British Pound (GBP)'), ('NGN', 'Nigerian Naira (NGN)')],
+                          validators=[DataRequired()])
+    category = SelectField('Category', choices={
+        'Expense': [('Food', 'Food'), ('Transport', 'Transport'), ('Entertainment', 'Entertainment'),
+                    ('Bills', 'Bills'), ('Other', 'Other')],
+        'Income': [('Salary', 'Salary'), ('Bonus', 'Bonus'), ('Freelance', 'Freelance'), ('Gift', 'Gift'),
+                   ('Other', 'Other')],
+    }, validators=[DataRequired()])
+    description = StringField('Description', validators=[Length(max=200)])
+    interval = SelectField('Repeats', choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'),
+                                               ('yearly', 'Yearly')], default='monthly', validators=[DataRequired()])
+    every = IntegerField('Every', default=1, validators=[DataRequired(), NumberRange(min=1, max=366)])
+    start_date = DateField('Starts', validators=[DataRequired()], default=datetime.utcnow)
+    end_date = DateField('Ends', validators=[Optional()])
+
+    def validate_category(self, field):
+        if self.type.data in self.category.choices and field.data not in dict(self.category.choices[self.type.data]):
+            raise ValidationError(f'{field.data} is not an {self.type.data.lower()} category.')
+
+    def validate_end_date(self, field):
+        if field.data and self.start_date.data and field.data < self.start_date.data:
+            raise ValidationError('The end date must not be before the start date.')
+
 # Database Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -120,6 +580,7 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.Text, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     currency = db.Column(db.String(3), default='USD')
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every data change
 
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -129,6 +590,12 @@ class Expense(db.Model):
     category = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(200))
     date = db.Column(db.DateTime, nullable=False)
+    import_key = db.Column(db.String(40))  # Dedup key for rows created by a bulk import
+    __table_args__ = (
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_user_currency_date', 'user_id', 'currency', 'date'),
+        db.Index('ix_expense_user_import_key', 'user_id', 'import_key', unique=True),
+    )
 
 class Income(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -138,6 +605,28 @@ class Income(db.Model):
     category = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(200))
     date = db.Column(db.DateTime, nullable=False)
+    import_key = db.Column(db.String(40))  # Dedup key for rows created by a bulk import
+    __table_args__ = (
+        db.Index('ix_income_user_date', 'user_id', 'date'),
+        db.Index('ix_income_user_currency_date', 'user_id', 'currency', 'date'),
+        db.Index('ix_income_user_import_key', 'user_id', 'import_key', unique=True),
+    )
+
+# Full-text index over descriptions. SQLite keeps an FTS5 table that the write paths update; rowid encodes
+# (id, type) and the owner column holds 'u<user_id>' so a user's matches are found without scanning others'.
+# PostgreSQL uses a GIN expression index on each table instead, which the database maintains itself.
+search_table = Table('transaction_search', MetaData(), db.Column('rowid', db.Integer, primary_key=True),
+                     db.Column('description', db.Text), db.Column('owner', db.Text))
+event.listen(Income.__table__, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transaction_search USING fts5(description, owner, "
+    "tokenize='unicode61 remove_diacritics 2')").execute_if(dialect='sqlite'))
+event.listen(Income.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS transaction_search').execute_if(dialect='sqlite'))
+event.listen(Expense.__table__, 'after_create', DDL(
+    "CREATE INDEX IF NOT EXISTS ix_expense_description_search ON expense "
+    "USING gin (to_tsvector('simple', coalesce(description, '')))").execute_if(dialect='postgresql'))
+event.listen(Income.__table__, 'after_create', DDL(
+    "CREATE INDEX IF NOT EXISTS ix_income_description_search ON income "
+    "USING gin (to_tsvector('simple', coalesce(description, '')))").execute_if(dialect='postgresql'))
 
 class ExchangeRate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -145,113 +634,1380 @@ class ExchangeRate(db.Model):
     to_currency = db.Column(db.String(3), nullable=False)
     rate = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_exchange_rate_pair_timestamp', 'from_currency', 'to_currency', 'timestamp'),
+    )
+
+class CategoryRollup(db.Model):
+    # Running per-month category totals, maintained alongside Expense/Income writes
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)  # 'Expense' or 'Income'
+    category = db.Column(db.String(50), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'type', 'category', 'currency', name='uq_category_rollup_key'),
+    )
+
+class OutboxMessage(db.Model):
+    # Mail waiting to be delivered by the outbox sender
+    __read_from_primary__ = True  # claimed by the sender, so a lagging replica would hand out sent mail
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    sender = db.Column(db.String(120))
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_outbox_message_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class CurrencyConversion(db.Model):
+    # Resumable background job converting a user's history to a new currency
+    __read_from_primary__ = True  # claims and heartbeats read the row they are about to move
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    old_currency = db.Column(db.String(3), nullable=False)
+    new_currency = db.Column(db.String(3), nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, running, done, failed
+    total_rows = db.Column(db.Integer, nullable=False, default=0)
+    converted_rows = db.Column(db.Integer, nullable=False, default=0)
+    last_expense_id = db.Column(db.Integer, nullable=False, default=0)
+    last_income_id = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TaskLease(db.Model):
+    # Cross-worker single-flight for periodic jobs: whoever moves locked_until forward runs the job
+    __read_from_primary__ = True  # claim_task_lease decides from the lease it just failed to update
+    name = db.Column(db.String(50), primary_key=True)
+    locked_until = db.Column(db.DateTime, nullable=False)
+
+class Budget(db.Model):
+    # Monthly spending limit for one expense category, in the user's currency (converted along with it).
+    # Spend is read from the category's rollups, which every write keeps current
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    alerted_month = db.Column(db.Integer)  # month_index() of the month alerted_level applies to
+    alerted_level = db.Column(db.Integer, nullable=False, default=0)  # Highest alert level already queued that month
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'category', name='uq_budget_user_category'),
+    )
+
+class RecurringRule(db.Model):
+    # A repeating income or expense. Occurrences before next_date exist as Expense/Income rows; later ones
+    # are only projected, until the materializer inserts them once they fall due
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    type = db.Column(db.String(10), nullable=False)  # 'Expense' or 'Income'
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)  # Rows are converted to the owner's currency when inserted
+    category = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.String(200))
+    interval = db.Column(db.String(10), nullable=False)  # daily, weekly, monthly, yearly
+    every = db.Column(db.Integer, nullable=False, default=1)  # e.g. 2 with 'weekly' for fortnightly
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime)  # Last day an occurrence may fall on; open-ended when NULL
+    next_date = db.Column(db.DateTime)  # First occurrence not yet inserted; NULL once the rule has run out
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_recurring_rule_next_date', 'next_date'),
+    )
+
+class CachedUser(UserMixin):
+    """The User fields routes read, cached per worker so authenticated requests skip the user query."""
+
+    def __init__(self, id, username, currency, data_version):
+        self.id = id
+        self.username = username
+        self.currency = currency
+        self.data_version = data_version
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    # The session remembers the newest data_version this user wrote, so a worker holding an older
+    # copy reloads it instead of showing stale currency or cached pages
+    min_version = session.get('data_version', 0)
+    user = user_cache.get(user_id)
+    if user is not None and user.data_version >= min_version:
+        user_cache_stats['hit'] += 1
+        return user
+    user_cache_stats['miss'] += 1
+    row = db.session.query(User.id, User.username, User.currency, User.data_version).filter_by(id=user_id).first()
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    if user.data_version < min_version:
+        session['data_version'] = user.data_version  # the bump was rolled back
+    user_cache.set(user_id, user)
+    return user
+
+def invalidate_cached_user(user_id):
+    user_cache.delete(user_id)
+
+class Metrics:
+    """Minimal thread-safe counters and histograms rendered in the Prometheus text format."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+    # Histograms that are not durations get buckets on their own scale
+    HISTOGRAM_BUCKETS = {'db_statements_per_request': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}  # (name, labels) -> [bucket counts..., overflow (above the last bucket), count, sum]
+
+    def buckets(self, name):
+        return self.HISTOGRAM_BUCKETS.get(name, self.BUCKETS)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            buckets = self.buckets(name)
+            histogram = self.histograms.setdefault(key, [0] * (len(buckets) + 3))
+            histogram[bisect.bisect_left(buckets, value)] += 1  # len(buckets) is the overflow slot
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    @staticmethod
+    def format_labels(labels, **extra):
+        labels = list(labels) + list(extra.items())
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+    def render(self, extra_counters=()):
+        lines = []
+        with self.lock:
+            counters = sorted(list(self.counters.items()) + list(extra_counters))
+            histograms = sorted(self.histograms.items())
+        for (name, labels), value in counters:
+            lines.append(f"{name}{self.format_labels(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(self.buckets(name), histogram):
+                cumulative += count
+                lines.append(f"{name}_bucket{self.format_labels(labels, le=f'{bound:g}')} {cumulative}")
+            lines.append(f"{name}_bucket{self.format_labels(labels, le='+Inf')} {histogram[-2]}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {histogram[-1]:g}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets report readers run alongside the add/delete writers instead of queueing on one file lock
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in ('journal_mode=WAL', 'synchronous=NORMAL', 'busy_timeout=5000', 'cache_size=-16000',
+                   'temp_store=MEMORY', 'mmap_size=268435456'):
+        cursor.execute(f'PRAGMA {pragma}')
+    cursor.close()
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append((context, time.perf_counter()))
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()[1]
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
+
+def handle_cursor_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time so the connection's stack
+    # stays in step (errors raised before the statement was sent pushed nothing)
+    stack = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if stack and stack[-1][0] is exception_context.execution_context:
+        stack.pop()
+
+def instrument_engines(app):
+    # Listeners go on this app's engines only, so other engines in the process (another app, a script's own
+    # create_engine) keep their own settings; engines connect lazily, so this runs before their first connection
+    with app.app_context():
+        for engine in db.engines.values():
+            if app.config['SQLITE_PRAGMAS']:
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(engine, 'handle_error', handle_cursor_error)
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+
+@bp.before_app_request
+def start_outbox_sender():
+    # In 'thread' mode a worker's sender starts with its first request, so mail waiting for a retry is delivered
+    # after a restart even if nothing new is queued
+    if current_app.extensions['expense_tracker']['outbox_sender'] is None:
+        wake_outbox_sender()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        # View name without the blueprint prefix, so labels stay as they were before the app factory
+        endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_started,
+                        endpoint=endpoint, method=request.method)
+        metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe('db_statements_per_request', g.sql_statements, endpoint=endpoint)
+        metrics.inc('db_statements_total', g.sql_statements, endpoint=endpoint)
+        metrics.inc('db_seconds_total', g.sql_seconds, endpoint=endpoint)
+    return response
 
 # Helper Functions
+class RateSnapshot:
+    """Immutable view of the latest BASE_CURRENCY rates, served from memory."""
+
+    def __init__(self, rates, as_of):
+        self.rates = dict(rates)
+        self.as_of = as_of  # timestamp of the oldest rate in the snapshot
+        self.checked_at = datetime.utcnow()
+
+    @classmethod
+    def load(cls):
+        # Latest rate per currency in a single query
+        latest = db.session.query(
+            ExchangeRate.to_currency, db.func.max(ExchangeRate.timestamp).label('timestamp')
+        ).filter_by(from_currency=BASE_CURRENCY).group_by(ExchangeRate.to_currency).subquery()
+        rows = db.session.query(ExchangeRate.to_currency, ExchangeRate.rate, ExchangeRate.timestamp).join(
+            latest, db.and_(ExchangeRate.to_currency == latest.c.to_currency,
+                            ExchangeRate.timestamp == latest.c.timestamp)
+        ).filter(ExchangeRate.from_currency == BASE_CURRENCY).all()
+        rates = {to_currency: rate for to_currency, rate, _ in rows}
+        as_of = min((timestamp for _, _, timestamp in rows), default=None)
+        return cls(rates, as_of)
+
+    def is_fresh(self):
+        # All supported rates present and none older than RATE_MAX_AGE
+        if self.as_of is None or any(c not in self.rates for c in SUPPORTED_CURRENCIES):
+            return False
+        return self.as_of >= datetime.utcnow() - RATE_MAX_AGE
+
+    def recently_checked(self):
+        return self.checked_at >= datetime.utcnow() - RATE_RETRY_INTERVAL
+
+    def base_rate(self, to_currency):
+        if to_currency in self.rates:
+            return self.rates[to_currency]
+        logger.warning("No rate found for %s to %s, using 1.0", BASE_CURRENCY, to_currency)
+        return 1.00 if to_currency == BASE_CURRENCY else 0.0  # Error if not base
+
+    def rate(self, from_currency, to_currency):
+        if from_currency == to_currency:
+            return 1.00
+        base_to_from = self.base_rate(from_currency)
+        if base_to_from == 0:
+            logger.error(f"Invalid base rate for {from_currency}")
+            return 1.00  # Fallback
+        return self.base_rate(to_currency) / base_to_from
+
+class RateTimeline:
+    """Every stored BASE_CURRENCY rate, per currency in timestamp order, for as-of lookups in memory."""
+
+    def __init__(self, rows):
+        # rows are (to_currency, timestamp, rate) ordered by timestamp
+        self.timestamps = defaultdict(list)
+        self.rates = defaultdict(list)
+        for to_currency, timestamp, rate in rows:
+            self.timestamps[to_currency].append(timestamp)
+            self.rates[to_currency].append(rate)
+        self.latest = max((t[-1] for t in self.timestamps.values()), default=None)
+
+    @classmethod
+    def load(cls):
+        rows = db.session.query(ExchangeRate.to_currency, ExchangeRate.timestamp, ExchangeRate.rate).filter_by(
+            from_currency=BASE_CURRENCY).order_by(ExchangeRate.timestamp, ExchangeRate.id).all()
+        return cls(rows)
+
+    def base_rate_at(self, to_currency, when):
+        # Rate in force at `when`; dates before the first stored rate use the earliest one
+        timestamps = self.timestamps.get(to_currency)
+        if not timestamps:
+            return None
+        index = max(bisect.bisect_right(timestamps, when) - 1, 0)
+        return self.rates[to_currency][index]
+
+    def rate_at(self, from_currency, to_currency, when):
+        if from_currency == to_currency:
+            return 1.00
+        base_to_from = self.base_rate_at(from_currency, when)
+        base_to_to = self.base_rate_at(to_currency, when)
+        if not base_to_from or base_to_to is None:
+            # No history for this pair yet
+            return get_exchange_rate(from_currency, to_currency)
+        return base_to_to / base_to_from
+
+def get_exchange_rate_session():
+    # Imported and created on first use and per process, so workers neither pay for requests at boot nor share
+    # a parent's pooled sockets after a fork
+    global exchange_rate_session
+    with exchange_rate_session_lock:
+        if exchange_rate_session is None or exchange_rate_session[0] != os.getpid():
+            import requests
+            exchange_rate_session = (os.getpid(), requests.Session())
+        return exchange_rate_session[1]
+
 def refresh_rates():
+    # Fetch and store the latest rates; returns True on success
     try:
-        url = f"https://v6.exchangerate-api.com/v6/{app.config['EXCHANGE_RATE_API_KEY']}/latest/{BASE_CURRENCY}"
-        logger.debug(f"Fetching all exchange rates from {url}")
-        response = requests.get(url)
+        url = f"{current_app.config['EXCHANGE_RATE_API_URL']}/{current_app.config['EXCHANGE_RATE_API_KEY']}/latest/{BASE_CURRENCY}"
+        logger.debug("Fetching all exchange rates from %s", url)
+        started = time.perf_counter()
+        try:
+            response = get_exchange_rate_session().get(url, timeout=current_app.config['EXCHANGE_RATE_API_TIMEOUT'])
+        finally:
+            metrics.observe('exchange_rate_api_duration_seconds', time.perf_counter() - started)
         response.raise_for_status()
         data = response.json()
         if data['result'] == 'success':
             now = datetime.utcnow()
+            rates = {}
             for to_currency in SUPPORTED_CURRENCIES:
                 rate = data['conversion_rates'].get(to_currency, 1.0 if to_currency == BASE_CURRENCY else None)
                 if rate is not None:
                     new_rate = ExchangeRate(from_currency=BASE_CURRENCY, to_currency=to_currency, rate=rate, timestamp=now)
                     db.session.add(new_rate)
-                    cache[f"{BASE_CURRENCY}_{to_currency}"] = rate
+                    rates[to_currency] = rate
             db.session.commit()
+            # Swap in the new snapshot in one assignment so readers never see a partial update
+            cache.set(RATE_SNAPSHOT_KEY, RateSnapshot(rates, now))
+            cache.delete(RATE_TIMELINE_KEY)
             logger.debug("Exchange rates refreshed successfully")
-        else:
-            logger.error(f"API error: {data.get('error-type', 'Unknown error')}")
+            return True
+        logger.error(f"API error: {data.get('error-type', 'Unknown error')}")
     except Exception as e:
+        db.session.rollback()
+        metrics.inc('exchange_rate_api_errors_total')
         logger.error(f"Error refreshing exchange rates: {str(e)}")
+    return False
 
-def rates_are_fresh():
-    # Check if all supported rates from BASE_CURRENCY are present and not older than 7 days
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    for to_currency in SUPPORTED_CURRENCIES:
-        latest_rate = ExchangeRate.query.filter_by(from_currency=BASE_CURRENCY, to_currency=to_currency).order_by(ExchangeRate.timestamp.desc()).first()
-        if not latest_rate or latest_rate.timestamp < seven_days_ago:
-            return False
-    return True
+def claim_task_lease(name, duration):
+    # True if this process won the right to run `name` now. The lease is never released; it just
+    # expires, so a crashed holder cannot block the job and failed runs are retried at most once per lease
+    now = datetime.utcnow()
+    result = db.session.execute(db.update(TaskLease).where(TaskLease.name == name, TaskLease.locked_until <= now)
+                                .values(locked_until=now + duration))
+    if result.rowcount:
+        db.session.commit()
+        return True
+    if db.session.get(TaskLease, name) is not None:
+        db.session.commit()
+        return False
+    try:
+        db.session.add(TaskLease(name=name, locked_until=now + duration))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def refresh_rates_once():
+    # Single-flight across workers: only the lease holder calls the API
+    if not claim_task_lease('refresh_rates', RATE_REFRESH_LEASE):
+        logger.debug("Exchange rate refresh already claimed by another worker")
+        return False
+    return refresh_rates()
+
+def run_rate_refresher(app):
+    try:
+        with app.app_context():
+            # Another worker may have refreshed since this one loaded its snapshot
+            if not RateSnapshot.load().is_fresh():
+                refresh_rates_once()
+    except Exception as e:
+        logger.error(f"Rate refresher error: {str(e)}")
+
+def schedule_rate_refresh():
+    if current_app.config['RATE_REFRESH_MODE'] != 'thread':
+        return
+    state = current_app.extensions['expense_tracker']
+    with rate_refresher_lock:
+        if state['rate_refresher'] is None or not state['rate_refresher'].is_alive():
+            state['rate_refresher'] = threading.Thread(target=run_rate_refresher,
+                                                       args=(current_app._get_current_object(),),
+                                                       name='rate-refresh', daemon=True)
+            state['rate_refresher'].start()
+
+def get_rate_snapshot():
+    # Every rate lookup (get_exchange_rate, get_rate_timeline) starts here, so the exchange-rate cache
+    # hit/miss counters are kept here too
+    snapshot = cache.get(RATE_SNAPSHOT_KEY)
+    if snapshot is not None and (snapshot.is_fresh() or snapshot.recently_checked()):
+        metrics.inc('exchange_rate_cache_hits_total')
+        return snapshot
+    metrics.inc('exchange_rate_cache_misses_total')
+    with rate_snapshot_lock:
+        snapshot = cache.get(RATE_SNAPSHOT_KEY)
+        if snapshot is not None and (snapshot.is_fresh() or snapshot.recently_checked()):
+            return snapshot
+        # Another worker may already have refreshed the table
+        snapshot = RateSnapshot.load()
+        cache.set(RATE_SNAPSHOT_KEY, snapshot)
+        if not snapshot.rates:
+            # Nothing to serve yet (first start): fetch inline, bounded by the API timeout
+            refresh_rates_once()
+        elif not snapshot.is_fresh():
+            # Stale-while-revalidate: keep serving the last known rates while the refresher runs
+            schedule_rate_refresh()
+        return cache.get(RATE_SNAPSHOT_KEY, snapshot)
 
 def get_exchange_rate(from_currency, to_currency):
     if from_currency == to_currency:
         return 1.00
-    
-    # Ensure rates are fresh
-    if not rates_are_fresh():
-        refresh_rates()
-    
-    # Get rate from BASE to from and BASE to to
-    base_to_from = get_base_rate(from_currency)
-    base_to_to = get_base_rate(to_currency)
-    
-    if base_to_from == 0:
-        logger.error(f"Invalid base rate for {from_currency}")
-        return 1.00  # Fallback
-    
-    rate = base_to_to / base_to_from
-    logger.debug(f"Calculated rate {from_currency} to {to_currency}: {rate}")
+    rate = get_rate_snapshot().rate(from_currency, to_currency)
+    logger.debug("Calculated rate %s to %s: %s", from_currency, to_currency, rate)
     return rate
 
-def get_base_rate(to_currency):
-    cache_key = f"{BASE_CURRENCY}_{to_currency}"
-    if cache_key in cache:
-        logger.debug(f"Using cached base rate for {to_currency}: {cache[cache_key]}")
-        return cache[cache_key]
-    
-    latest_rate = ExchangeRate.query.filter_by(from_currency=BASE_CURRENCY, to_currency=to_currency).order_by(ExchangeRate.timestamp.desc()).first()
-    if latest_rate:
-        cache[cache_key] = latest_rate.rate
-        logger.debug(f"Using DB base rate for {to_currency}: {latest_rate.rate}")
-        return latest_rate.rate
-    else:
-        logger.warning(f"No rate found for {BASE_CURRENCY} to {to_currency}, using 1.0")
-        return 1.00 if to_currency == BASE_CURRENCY else 0.0  # Error if not base
+def get_rate_timeline():
+    # Fetched once per import or materialization batch, which converts each row at its own date with rate_at.
+    # Reloaded when the current snapshot is newer than its last entry, e.g. after another worker refreshed
+    snapshot = get_rate_snapshot()
+    timeline = cache.get(RATE_TIMELINE_KEY)
+    if timeline is None or (snapshot.as_of is not None and (timeline.latest is None or timeline.latest < snapshot.as_of)):
+        timeline = RateTimeline.load()
+        cache.set(RATE_TIMELINE_KEY, timeline)
+    return timeline
 
-def convert_currency(amount, from_currency, to_currency):
-    if from_currency == to_currency:
-        return amount
-    rate = get_exchange_rate(from_currency, to_currency)
-    converted_amount = amount * rate
-    logger.debug(f"Converting {amount} {from_currency} to {to_currency} with rate {rate}: {converted_amount}")
-    return converted_amount
+def compact_exchange_rates():
+    # Keep only the last stored rate of each day per currency pair; returns the number of rows deleted
+    keep = db.select(db.func.max(ExchangeRate.id)).group_by(
+        ExchangeRate.from_currency, ExchangeRate.to_currency, db.func.date(ExchangeRate.timestamp))
+    result = db.session.execute(db.delete(ExchangeRate).where(ExchangeRate.id.not_in(keep)),
+                                execution_options={'synchronize_session': False})
+    db.session.commit()
+    cache.delete(RATE_TIMELINE_KEY)
+    return result.rowcount
 
+
+@bp.app_template_global()
 def get_currency_symbol(currency):
     symbols = {'USD': '$', 'EUR': '€', 'GBP': '£', 'NGN': '₦'}
     return symbols.get(currency, '$')
 
+def run_password_hashing(function, *args):
+    # Hash on the bounded process pool so a burst of logins can't starve other requests of the GIL
+    if current_app.config['PASSWORD_HASH_WORKERS'] <= 0:
+        return function(*args)
+    slots = password_hash_slots._get_current_object()  # released from the pool's thread, outside the app context
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable('Too many sign-in requests, please retry shortly.', retry_after=1)
+    try:
+        future = get_password_hash_executor().submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the hash has really finished, even after a timeout, so the backlog stays bounded
+    future.add_done_callback(lambda future: slots.release())
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+    except TimeoutError:  # concurrent.futures.TimeoutError
+        future.cancel()  # still queued: drop it now
+        raise ServiceUnavailable('Sign-in is taking too long, please retry shortly.', retry_after=1)
+
+def get_password_hash_executor():
+    # Created lazily and per process, so gunicorn workers never share a pool forked from the parent
+    global password_hash_executor
+    with password_hash_lock:
+        if password_hash_executor is None or password_hash_executor[0] != os.getpid():
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+            # Fresh interpreters rather than forks of this worker, whose mail, rate and recurring threads may hold
+            # locks at the moment of a fork. As with any such pool, the children re-import the __main__ module, so
+            # scripts that hash passwords need an `if __name__ == '__main__'` guard (or PASSWORD_HASH_WORKERS=0)
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            password_hash_executor = (os.getpid(), ProcessPoolExecutor(
+                max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+                mp_context=multiprocessing.get_context(start_method)))
+        return password_hash_executor[1]
+
+def hash_password(password):
+    return run_password_hashing(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return run_password_hashing(check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=None)
+def normalized_hash_method(method):
+    # Werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1', 'pbkdf2:sha256' -> 'pbkdf2:sha256:600000');
+    # the prefix of a real hash is what stored hashes are compared against
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def password_needs_rehash(password_hash):
+    # Werkzeug hashes look like 'method:params$salt$hash'
+    return password_hash.split('$', 1)[0] != normalized_hash_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+def enqueue_mail(recipient, subject, body):
+    # Queue a message for the outbox sender; the caller commits it with its own transaction
+    db.session.add(OutboxMessage(recipient=recipient, sender=current_app.config['MAIL_USERNAME'], subject=subject, body=body))
+
 def send_reset_email(user):
     token = serializer.dumps(user.email, salt='password-reset')
-    reset_url = url_for('reset_password', token=token, _external=True)
-    msg = Message('Password Reset Request', sender=app.config['MAIL_USERNAME'], recipients=[user.email])
-    msg.body = f'Click this link to reset your password: {reset_url}\nThis link expires in 30 minutes.'
-    mail.send(msg)
+    reset_url = url_for('main.reset_password', token=token, _external=True)
+    enqueue_mail(user.email, 'Password Reset Request',
+                 f'Click this link to reset your password: {reset_url}\nThis link expires in 30 minutes.')
+    db.session.commit()
+    wake_outbox_sender()
+
+def schedule_mail_retry(message, error, now):
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+        message.status = 'failed'
+        logger.error(f"Giving up on mail {message.id} to {message.recipient}: {error}")
+    else:
+        delay = current_app.config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (message.attempts - 1)
+        message.next_attempt_at = now + timedelta(seconds=delay)
 
+def deliver_outbox():
+    """Send one batch of due messages over a single SMTP connection; returns how many were attempted."""
+    now = datetime.utcnow()
+    due = OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now
+    candidates = db.session.query(OutboxMessage.id).filter(*due).order_by(OutboxMessage.id).limit(
+        current_app.config['MAIL_OUTBOX_BATCH_SIZE']).with_for_update(skip_locked=True).scalar_subquery()
+    # Lease the batch so another sender skips it; a crashed sender's lease simply expires. The UPDATE re-checks
+    # that each row is still due, so on SQLite (where FOR UPDATE is a no-op) two senders polling together claim
+    # disjoint rows, and only what this one claimed is sent
+    claimed = db.session.execute(
+        db.update(OutboxMessage).where(OutboxMessage.id.in_(candidates), *due)
+        .values(next_attempt_at=now + MAIL_OUTBOX_LEASE).returning(OutboxMessage.id),
+        execution_options={'synchronize_session': False}).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return 0
+    messages = OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id).all()
+    try:
+        from flask_mail import Message
+        with get_mail().connect() as connection:
+            for message in messages:
+                try:
+                    connection.send(Message(message.subject, sender=message.sender,
+                                            recipients=[message.recipient], body=message.body))
+                    message.status = 'sent'
+                    message.sent_at = datetime.utcnow()
+                except smtplib.SMTPRecipientsRefused as e:
+                    schedule_mail_retry(message, e, now)
+    except Exception as e:
+        # Connection-level failure: everything not yet sent is retried with backoff
+        logger.error(f"Error delivering mail: {str(e)}")
+        for message in messages:
+            if message.status == 'pending':
+                schedule_mail_retry(message, e, now)
+    db.session.commit()
+    return len(messages)
+
+def run_outbox_sender(app):
+    wakeup = app.extensions['expense_tracker']['outbox_wakeup']
+    while True:
+        wakeup.wait(app.config['MAIL_OUTBOX_POLL_INTERVAL'])
+        wakeup.clear()
+        try:
+            with app.app_context():
+                while deliver_outbox():
+                    pass
+        except Exception as e:
+            logger.error(f"Outbox sender error: {str(e)}")
+
+def wake_outbox_sender():
+    if current_app.config['MAIL_OUTBOX_MODE'] != 'thread':
+        return
+    state = current_app.extensions['expense_tracker']
+    with outbox_sender_lock:
+        if state['outbox_sender'] is None or not state['outbox_sender'].is_alive():
+            state['outbox_sender'] = threading.Thread(target=run_outbox_sender,
+                                                      args=(current_app._get_current_object(),),
+                                                      name='mail-outbox', daemon=True)
+            state['outbox_sender'].start()
+    state['outbox_wakeup'].set()
+
+ROLLUP_KEY = ('user_id', 'year', 'month', 'type', 'category', 'currency')
+
+def upsert_rollups(rows):
+    # Add total/count deltas to the rollups in one INSERT ... ON CONFLICT DO UPDATE, so the arithmetic happens
+    # in SQL: concurrent writers to the same month and category neither lose updates nor collide on the insert
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    for start in range(0, len(rows), 1000):  # well under SQLite's bound-parameter limit
+        statement = insert(CategoryRollup).values(rows[start:start + 1000])
+        db.session.execute(statement.on_conflict_do_update(index_elements=ROLLUP_KEY, set_={
+            'total': CategoryRollup.total + statement.excluded.total,
+            'count': CategoryRollup.count + statement.excluded.count,
+        }))
+
+def update_rollup(user_id, type, date, category, currency, amount, count=1):
+    # Apply a delta to the monthly rollup; the caller commits it with the transaction row
+    upsert_rollups([dict(user_id=user_id, year=date.year, month=date.month, type=type, category=category,
+                         currency=currency, total=amount, count=count)])
+    if count < 0:
+        db.session.execute(db.delete(CategoryRollup).where(
+            CategoryRollup.user_id == user_id, CategoryRollup.year == date.year, CategoryRollup.month == date.month,
+            CategoryRollup.type == type, CategoryRollup.category == category, CategoryRollup.currency == currency,
+            CategoryRollup.count <= 0))
+
+def apply_rollup_deltas(user_id, deltas):
+    # Bulk form of update_rollup: deltas maps (type, year, month, category, currency) -> [total, count]
+    if not deltas:
+        return
+    upsert_rollups([dict(user_id=user_id, year=year, month=month, type=type, category=category, currency=currency,
+                         total=total, count=count)
+                    for (type, year, month, category, currency), (total, count) in deltas.items()])
+
+def convert_rollups(user_id, old_currency, new_currency, rate):
+    # Set-based, three statements however long the history: fold old-currency rollups into the new-currency rows
+    # already there for the same month and category, drop those, then convert the rest in place
+    rollup = CategoryRollup.__table__
+    other = rollup.alias('other')
+
+    def same_key(currency):
+        return db.and_(other.c.user_id == rollup.c.user_id, other.c.currency == currency,
+                       other.c.year == rollup.c.year, other.c.month == rollup.c.month,
+                       other.c.type == rollup.c.type, other.c.category == rollup.c.category)
+
+    db.session.execute(db.update(rollup).where(
+        rollup.c.user_id == user_id, rollup.c.currency == new_currency, db.exists().where(same_key(old_currency))
+    ).values(total=rollup.c.total + db.select(other.c.total * rate).where(same_key(old_currency)).scalar_subquery(),
+             count=rollup.c.count + db.select(other.c.count).where(same_key(old_currency)).scalar_subquery()))
+    db.session.execute(db.delete(rollup).where(
+        rollup.c.user_id == user_id, rollup.c.currency == old_currency, db.exists().where(same_key(new_currency))))
+    db.session.execute(db.update(rollup).where(rollup.c.user_id == user_id, rollup.c.currency == old_currency)
+                       .values(total=rollup.c.total * rate, currency=new_currency))
+
+def convert_budgets(user_id, rate):
+    db.session.execute(db.update(Budget).where(Budget.user_id == user_id).values(amount=Budget.amount * rate),
+                       execution_options={'synchronize_session': False})
+
+def get_category_spend(user_id, currency, year, month, category):
+    # One month's spend in one category, read from its rollups (one per stored currency, normally just one)
+    rows = db.session.query(CategoryRollup.currency, CategoryRollup.total).filter_by(
+        user_id=user_id, year=year, month=month, type='Expense', category=category).all()
+    return sum(total if row_currency == currency else total * get_exchange_rate(row_currency, currency)
+               for row_currency, total in rows)
+
+def check_budget_alerts(user_id, keys):
+    """Queue an alert mail for each budget whose spend just crossed an alert level; returns True if any were queued.
+
+    keys are the (year, month, category) expense rollups the caller has just changed; only the current month
+    can alert. The mail commits with the caller's transaction, which should wake the outbox sender afterwards.
+    """
+    now = datetime.utcnow() + timedelta(hours=1)
+    categories = {category for year, month, category in keys if (year, month) == (now.year, now.month)}
+    if not categories:
+        return False
+    budgets = Budget.query.filter(Budget.user_id == user_id, Budget.category.in_(categories)).all()
+    if not budgets:
+        return False
+    user = db.session.get(User, user_id)
+    queued = False
+    for budget in budgets:
+        spent = get_category_spend(user_id, user.currency, now.year, now.month, budget.category)
+        level = max((level for level in current_app.config['BUDGET_ALERT_LEVELS'] if spent >= budget.amount * level / 100),
+                    default=0)
+        alerted = budget.alerted_level if budget.alerted_month == month_index(now) else 0
+        if level > alerted:
+            symbol = get_currency_symbol(user.currency)
+            enqueue_mail(user.email, f'Budget alert: {budget.category} at {level}%',
+                         f'You have spent {symbol}{spent:.2f} of your {symbol}{budget.amount:.2f} {budget.category} '
+                         f'budget for {now:%B %Y} ({spent / budget.amount:.0%}).')
+            budget.alerted_month, budget.alerted_level = month_index(now), level
+            queued = True
+    return queued
+
+def convert_grouped_totals(rows, currency):
+    # rows are (type, category, row currency, sum) groups; each distinct currency is converted
+    # with one rate lookup, so a mixed-currency period costs no more than a single-currency one.
+    # Returns ({category: total} for expenses, {category: total} for incomes) in currency
+    rates = {currency: 1.0}
+    totals = {'Expense': {}, 'Income': {}}
+    for type, category, row_currency, total in rows:
+        if row_currency not in rates:
+            rates[row_currency] = get_exchange_rate(row_currency, currency)
+        totals[type][category] = totals[type].get(category, 0.0) + float(total) * rates[row_currency]
+    return totals['Expense'], totals['Income']
+
+def get_rollup_totals(user_id, currency, year, month=None):
+    # Returns ({category: total} for expenses, {category: total} for incomes), converted to currency
+    query = db.session.query(CategoryRollup.type, CategoryRollup.category, CategoryRollup.currency,
+                             db.func.sum(CategoryRollup.total)).filter(
+        CategoryRollup.user_id == user_id, CategoryRollup.year == year)
+    if month is not None:
+        query = query.filter(CategoryRollup.month == month)
+    return convert_grouped_totals(
+        query.group_by(CategoryRollup.type, CategoryRollup.category, CategoryRollup.currency).all(), currency)
+
+def compute_rollups():
+    # Recompute every rollup row from the raw Expense/Income tables
+    rollups = {}
+    for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+        year = db.extract('year', model.date)
+        month = db.extract('month', model.date)
+        rows = db.session.query(model.user_id, year, month, model.category, model.currency,
+                                db.func.sum(model.amount), db.func.count(model.id)).group_by(
+            model.user_id, year, month, model.category, model.currency).all()
+        for user_id, y, m, category, currency, total, count in rows:
+            rollups[(user_id, int(y), int(m), type, category, currency)] = (float(total), count)
+    return rollups
+
+def rebuild_rollups(verify_only=False):
+    expected = compute_rollups()
+    stored = {(r.user_id, r.year, r.month, r.type, r.category, r.currency): r for r in CategoryRollup.query.all()}
+    drift = []
+    for key in set(expected) | set(stored):
+        want_total, want_count = expected.get(key, (0.0, 0))
+        row = stored.get(key)
+        have_total, have_count = (row.total, row.count) if row else (0.0, 0)
+        if abs(want_total - have_total) > 1e-6 or want_count != have_count:
+            drift.append((key, (have_total, have_count), (want_total, want_count)))
+            if verify_only:
+                continue
+            if row is None:
+                row = CategoryRollup(user_id=key[0], year=key[1], month=key[2], type=key[3],
+                                     category=key[4], currency=key[5])
+                db.session.add(row)
+            if want_count:
+                row.total, row.count = want_total, want_count
+            else:
+                db.session.delete(row)
+    if not verify_only:
+        db.session.commit()
+    return drift
+
+def convert_transaction_rows(model, user_id, old_currency, new_currency, rate, after_id=0, limit=None):
+    # Convert rows in place with one UPDATE; with a limit, only the next keyset chunk after after_id.
+    # Returns (rows converted, last id covered)
+    criteria = [model.user_id == user_id, model.currency == old_currency, model.id > after_id]
+    last_id = None
+    if limit is not None:
+        chunk_ids = db.session.query(model.id).filter(*criteria).order_by(model.id).limit(limit).subquery()
+        last_id = db.session.query(db.func.max(chunk_ids.c.id)).scalar()
+        if last_id is None:
+            return 0, after_id
+        criteria.append(model.id <= last_id)
+    result = db.session.execute(
+        db.update(model).where(*criteria).values(amount=model.amount * rate, currency=new_currency),
+        execution_options={'synchronize_session': False})
+    return result.rowcount, last_id
+
+def count_convertible_rows(user_id, currency):
+    return sum(db.session.query(db.func.count(model.id)).filter_by(user_id=user_id, currency=currency).scalar()
+               for model in (Expense, Income))
+
+def get_active_conversion(user_id):
+    job = CurrencyConversion.query.filter(CurrencyConversion.user_id == user_id,
+                                          CurrencyConversion.status.in_(['pending', 'running'])).first()
+    if job is not None and job.updated_at <= datetime.utcnow() - CURRENCY_CONVERSION_LEASE:
+        # Its worker died (timeout, deploy, recycle) and stopped heartbeating; resume it here
+        start_currency_conversion(job.id)
+    return job
+
+def claim_currency_conversion(job_id):
+    # Like claim_task_lease: a conditional UPDATE, so only one process runs a job. Pending and failed jobs can be
+    # claimed, and running ones whose heartbeat is older than the lease. Returns the heartbeat, or None
+    now = datetime.utcnow()
+    result = db.session.execute(db.update(CurrencyConversion).where(
+        CurrencyConversion.id == job_id,
+        db.or_(CurrencyConversion.status.in_(['pending', 'failed']),
+               db.and_(CurrencyConversion.status == 'running',
+                       CurrencyConversion.updated_at <= now - CURRENCY_CONVERSION_LEASE))
+    ).values(status='running', error=None, updated_at=now))
+    db.session.commit()
+    return now if result.rowcount else None
+
+def renew_currency_conversion(job_id, heartbeat, **values):
+    # Write progress only if this process still holds the job (the heartbeat is unchanged since its last write);
+    # returns the new heartbeat, or None if the job was taken over and the caller must roll back
+    now = datetime.utcnow()
+    result = db.session.execute(db.update(CurrencyConversion).where(
+        CurrencyConversion.id == job_id, CurrencyConversion.status == 'running',
+        CurrencyConversion.updated_at == heartbeat).values(updated_at=now, **values))
+    return now if result.rowcount else None
+
+def run_currency_conversion(job_id):
+    # Process a conversion job in committed keyset chunks so it can resume after a crash
+    heartbeat = claim_currency_conversion(job_id)
+    if heartbeat is None:
+        return  # done, or running in another worker
+    job = db.session.get(CurrencyConversion, job_id)
+    chunk_size = current_app.config['CURRENCY_CONVERSION_CHUNK_SIZE']
+    try:
+        for model, last_attr in ((Expense, 'last_expense_id'), (Income, 'last_income_id')):
+            while True:
+                rows, last_id = convert_transaction_rows(model, job.user_id, job.old_currency, job.new_currency,
+                                                         job.rate, getattr(job, last_attr), chunk_size)
+                if not rows:
+                    break
+                heartbeat = renew_currency_conversion(job_id, heartbeat, **{
+                    last_attr: last_id, 'converted_rows': CurrencyConversion.converted_rows + rows})
+                if heartbeat is None:
+                    db.session.rollback()
+                    logger.warning("Currency conversion %s was taken over by another worker", job_id)
+                    return
+                db.session.commit()
+                logger.info("Currency conversion %s: %s/%s rows", job.id, job.converted_rows, job.total_rows)
+        convert_rollups(job.user_id, job.old_currency, job.new_currency, job.rate)
+        convert_budgets(job.user_id, job.rate)
+        db.session.execute(db.update(User).where(User.id == job.user_id).values(currency=job.new_currency))
+        bump_data_version(job.user_id)
+        # Only the holder finishes, so budgets and rollups are converted exactly once
+        if renew_currency_conversion(job_id, heartbeat, status='done') is None:
+            db.session.rollback()
+            logger.warning("Currency conversion %s was taken over by another worker", job_id)
+            return
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in currency conversion {job_id}: {str(e)}")
+        if renew_currency_conversion(job_id, heartbeat, status='failed', error=str(e)) is not None:
+            db.session.commit()
+
+def start_currency_conversion(job_id):
+    def target(app):
+        with app.app_context():
+            run_currency_conversion(job_id)
+    threading.Thread(target=target, args=(current_app._get_current_object(),), name=f'currency-conversion-{job_id}',
+                     daemon=True).start()
+
+def get_user_years(user_id):
+    # Distinct transaction years for a user, cached and kept current by the write routes
+    years = year_cache.get(user_id)
+    if years is None:
+        queries = [db.select(db.extract('year', model.date)).where(model.user_id == user_id).distinct()
+                   for model in (Expense, Income)]
+        years = frozenset(int(year) for year in db.session.execute(db.union(*queries)).scalars())
+        year_cache.set(user_id, years)
+    return years
+
+def note_transaction_year(user_id, year):
+    # An atomic update, so concurrent writers in other workers cannot drop each other's years
+    year_cache.update(user_id, lambda years: years | {year} if years is not None and year not in years else None)
+
+def forget_user_years(user_id):
+    # A delete may empty a year, so reload on next use
+    year_cache.delete(user_id)
+
+LedgerEntry = namedtuple('LedgerEntry', 'date type id amount currency category description')
+LedgerPage = namedtuple('LedgerPage', 'entries next_cursor prev_cursor')
+LEDGER_TYPE_RANK = {'Expense': 0, 'Income': 1}
+
+def encode_ledger_cursor(entry):
+    return f"{entry.date.isoformat()}_{entry.type}_{entry.id}"
+
+def decode_ledger_cursor(cursor):
+    # Returns (date, type rank, id), or None for a malformed cursor
+    try:
+        date, type, id = cursor.rsplit('_', 2)
+        return datetime.fromisoformat(date), LEDGER_TYPE_RANK[type], int(id)
+    except (AttributeError, ValueError, KeyError):
+        return None
+
+def ledger_keyset_filter(model, rank, cursor, descending):
+    # Rows strictly past the cursor in (date, type rank, id) order, for a table whose rank is fixed
+    cursor_date, cursor_rank, cursor_id = cursor
+    if descending:
+        if rank < cursor_rank:
+            return model.date <= cursor_date
+        if rank > cursor_rank:
+            return model.date < cursor_date
+        return db.or_(model.date < cursor_date, db.and_(model.date == cursor_date, model.id < cursor_id))
+    if rank > cursor_rank:
+        return model.date >= cursor_date
+    if rank < cursor_rank:
+        return model.date > cursor_date
+    return db.or_(model.date > cursor_date, db.and_(model.date == cursor_date, model.id > cursor_id))
+
+def get_ledger_page(user_id, start_date, end_date, currency=None, after=None, before=None, page_size=None):
+    """One page of expenses and incomes merged newest first, paginated by (date, type, id) cursors.
+
+    Each table's page is a LIMITed index scan; both come back in one UNION ALL and are merged here.
+    """
+    page_size = page_size or current_app.config['LEDGER_PAGE_SIZE']
+    cursor = decode_ledger_cursor(before) if before else decode_ledger_cursor(after) if after else None
+    descending = not (before and cursor)
+    branches = []
+    for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+        query = db.select(model.date.label('date'), db.literal(type).label('type'), model.id.label('id'),
+                          model.amount.label('amount'), model.currency.label('currency'),
+                          model.category.label('category'), model.description.label('description')).where(
+            model.user_id == user_id, model.date >= start_date, model.date < end_date)
+        if currency is not None:
+            query = query.where(model.currency == currency)
+        if cursor:
+            query = query.where(ledger_keyset_filter(model, LEDGER_TYPE_RANK[type], cursor, descending))
+        if descending:
+            query = query.order_by(model.date.desc(), model.id.desc())
+        else:
+            query = query.order_by(model.date, model.id)
+        branches.append(db.select(query.limit(page_size + 1).subquery()))
+    rows = [LedgerEntry(*row) for row in db.session.execute(db.union_all(*branches))]
+    rows.sort(key=lambda e: (e.date, LEDGER_TYPE_RANK[e.type], e.id), reverse=descending)
+    has_more = len(rows) > page_size
+    entries = rows[:page_size]
+    if not descending:
+        entries.reverse()
+    if not entries:
+        return LedgerPage([], None, None)
+    if descending:
+        next_cursor = encode_ledger_cursor(entries[-1]) if has_more else None
+        prev_cursor = encode_ledger_cursor(entries[0]) if cursor else None
+    else:
+        next_cursor = encode_ledger_cursor(entries[-1])
+        prev_cursor = encode_ledger_cursor(entries[0]) if has_more else None
+    return LedgerPage(entries, next_cursor, prev_cursor)
+
+SearchPage = namedtuple('SearchPage', 'entries page has_more')
+SEARCH_MAX_PAGE = 10000  # Deeper ?page= values are clamped; the OFFSET would overflow long before anyone pages there
+
+def index_for_search(model, type, *criteria):
+    # Add the matching rows to the SQLite FTS table; the caller commits with the rows themselves
+    if db.engine.dialect.name != 'sqlite':
+        return
+    rows = db.select(model.id * 2 + LEDGER_TYPE_RANK[type], model.description,
+                     db.literal('u') + db.cast(model.user_id, db.String)).where(model.description.is_not(None), *criteria)
+    db.session.execute(search_table.insert().from_select(['rowid', 'description', 'owner'], rows))
+
+def unindex_for_search(type, id):
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(search_table.delete().where(search_table.c.rowid == id * 2 + LEDGER_TYPE_RANK[type]))
+
+def rebuild_search_index():
+    # Repopulate the SQLite FTS table from the raw rows; returns the number of rows indexed, or None on PostgreSQL
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    db.session.execute(search_table.delete())
+    for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+        index_for_search(model, type)
+    db.session.commit()
+    return db.session.execute(db.select(db.func.count()).select_from(search_table)).scalar()
+
+def search_transactions(user_id, text='', type=None, category=None, min_amount=None, max_amount=None,
+                        start_date=None, end_date=None, page=1, page_size=None):
+    """One page of a user's transactions matching every word of `text` (best matches first) and the filters.
+
+    Without text, matches are listed newest first. end_date is exclusive.
+    """
+    page_size = page_size or current_app.config['LEDGER_PAGE_SIZE']
+    terms = re.findall(r'\w+', text or '')
+    sqlite = db.engine.dialect.name == 'sqlite'
+    branches = []
+    for model, model_type in ((Expense, 'Expense'), (Income, 'Income')):
+        if type and type != model_type:
+            continue
+        criteria = [model.user_id == user_id]
+        if category:
+            criteria.append(model.category == category)
+        if min_amount is not None:
+            criteria.append(model.amount >= min_amount)
+        if max_amount is not None:
+            criteria.append(model.amount <= max_amount)
+        if start_date is not None:
+            criteria.append(model.date >= start_date)
+        if end_date is not None:
+            criteria.append(model.date < end_date)
+        query = db.select(model.date, db.literal(model_type).label('type'), model.id, model.amount, model.currency,
+                          model.category, model.description)
+        if terms and sqlite:
+            # Quoted terms can't be parsed as FTS5 operators; the owner term keeps the match to this user
+            match = f"owner:u{user_id} AND " + ' AND '.join(f'"{term}"' for term in terms)
+            rank = LEDGER_TYPE_RANK[model_type]
+            query = query.add_columns((-db.func.bm25(db.literal_column('transaction_search'), 1.0, 0.0)).label('rank')).join(
+                search_table, model.id == search_table.c.rowid.op('>>')(1)).where(
+                db.literal_column('transaction_search').match(match), search_table.c.rowid % 2 == rank)
+        elif terms:
+            # Same expression as the GIN index, so the planner can use it
+            vector = db.func.to_tsvector(db.literal_column("'simple'"), db.func.coalesce(model.description, ''))
+            tsquery = db.func.plainto_tsquery(db.literal_column("'simple'"), ' '.join(terms))
+            query = query.add_columns(db.func.ts_rank(vector, tsquery).label('rank')).where(vector.op('@@')(tsquery))
+        else:
+            query = query.add_columns(db.literal(0.0).label('rank'))
+        branches.append(query.where(*criteria))
+    if not branches:
+        return SearchPage([], page, False)
+    rows = db.union_all(*branches).subquery()
+    results = db.session.execute(
+        db.select(rows).order_by(rows.c.rank.desc(), rows.c.date.desc(), rows.c.id.desc())
+        .limit(page_size + 1).offset((page - 1) * page_size)).all()
+    entries = [LedgerEntry(*row[:7]) for row in results[:page_size]]
+    return SearchPage(entries, page, len(results) > page_size)
+
+Report = namedtuple('Report', 'start_date end_date currency expense_totals income_totals '
+                               'total_spent total_income balance ledger projected projected_spent projected_income')
+
+def is_month_aligned(start_date, end_date):
+    return all(d == datetime(d.year, d.month, 1) for d in (start_date, end_date))
+
+def get_period_totals(user_id, currency, start_date, end_date):
+    # Per-category totals in one round-trip: from rollups when the period covers whole
+    # months, otherwise one grouped UNION ALL over the raw rows. Rows in other currencies
+    # (e.g. mid-conversion) are summed per currency and converted to currency
+    if is_month_aligned(start_date, end_date):
+        months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month
+        if months == 12 and start_date.month == 1:
+            return get_rollup_totals(user_id, currency, start_date.year)
+        if months == 1:
+            return get_rollup_totals(user_id, currency, start_date.year, start_date.month)
+    branches = [
+        db.select(db.literal(type).label('type'), model.category.label('category'), model.currency.label('currency'),
+                  model.amount.label('amount')).where(
+            model.user_id == user_id, model.date >= start_date, model.date < end_date)
+        for model, type in ((Expense, 'Expense'), (Income, 'Income'))
+    ]
+    rows = db.union_all(*branches).subquery()
+    return convert_grouped_totals(db.session.execute(
+        db.select(rows.c.type, rows.c.category, rows.c.currency, db.func.sum(rows.c.amount)).group_by(
+            rows.c.type, rows.c.category, rows.c.currency)), currency)
+
+def build_report(user_id, currency, start_date, end_date, after=None, before=None, with_ledger=True):
+    """Totals in currency and (optionally) one ledger page for a period; shared by the HTML, CSV and JSON reports.
+
+    Ledger entries keep their stored amount and currency; only the totals are converted. With the ledger come
+    the period's projected recurring occurrences, totalled separately from the recorded ones. That is three
+    queries (totals, the ledger page, the recurring rules); without the ledger the totals are the only one.
+    """
+    expense_totals, income_totals = get_period_totals(user_id, currency, start_date, end_date)
+    total_spent = sum(expense_totals.values())
+    total_income = sum(income_totals.values())
+    ledger = get_ledger_page(user_id, start_date, end_date, after=after, before=before) if with_ledger else None
+    projected = get_projected_entries(user_id, start_date, end_date) if with_ledger else []
+    projected_expenses, projected_incomes = convert_grouped_totals(
+        ((entry.type, entry.category, entry.currency, entry.amount) for entry in projected), currency)
+    return Report(start_date, end_date, currency, expense_totals, income_totals,
+                  total_spent, total_income, total_income - total_spent, ledger,
+                  projected, sum(projected_expenses.values()), sum(projected_incomes.values()))
+
+def resolve_report_period(month, year):
+    # month is '1'-'12' or 'All'; returns (start_date, end_date, display label)
+    if month == 'All':
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1), f"Year: {year}"
+    start_date = datetime(year, int(month), 1)
+    # safe next-month calc
+    end_date = (start_date + timedelta(days=32)).replace(day=1)
+    return start_date, end_date, start_date.strftime('%B %Y')
+
+def month_index(date):
+    return date.year * 12 + date.month - 1
+
+def rolling_mean(values, window):
+    # Trailing mean over up to `window` months from one cumulative sum
+    import numpy as np
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+def trend_series(values, window):
+    import numpy as np
+    change = np.diff(values, prepend=np.nan)
+    return {
+        'values': np.round(values, 2).tolist(),
+        'rolling_average': np.round(rolling_mean(values, window), 2).tolist(),
+        'change': [None if np.isnan(delta) else round(float(delta), 2) for delta in change],
+    }
+
+def build_trends(user_id, currency, start_month, months, window=3):
+    """Monthly income/expense/net and per-category series for `months` months from start_month, in currency.
+
+    The range is read from the rollups as columns in one query and bucketed with a single bincount.
+    """
+    import numpy as np
+    first = month_index(start_month)
+    last_year = (first + months - 1) // 12
+    rows = db.session.query(CategoryRollup.type, CategoryRollup.category, CategoryRollup.currency,
+                            CategoryRollup.year * 12 + CategoryRollup.month - 1, CategoryRollup.total).filter(
+        CategoryRollup.user_id == user_id, CategoryRollup.year >= start_month.year, CategoryRollup.year <= last_year).all()
+    types, categories, currencies, indexes, totals = zip(*rows) if rows else ((),) * 5
+    offsets = np.asarray(indexes, dtype=np.int64) - first
+    in_range = (offsets >= 0) & (offsets < months)
+    # One rate per distinct currency, applied to the whole column
+    codes, currency_ids = np.unique(np.asarray(currencies, dtype=str), return_inverse=True)
+    rates = np.array([get_exchange_rate(code, currency) for code in codes], dtype=float)
+    amounts = np.asarray(totals, dtype=float) * rates[currency_ids]
+    keys, key_ids = np.unique(np.asarray([f"{t}\0{c}" for t, c in zip(types, categories)], dtype=str),
+                              return_inverse=True)
+    grid = np.bincount(key_ids[in_range] * months + offsets[in_range], weights=amounts[in_range],
+                       minlength=len(keys) * months).reshape(len(keys), months)
+    is_income = np.array([key.startswith('Income\0') for key in keys], dtype=bool)
+    income = grid[is_income].sum(axis=0)
+    expense = grid[~is_income].sum(axis=0)
+    by_category = {'Expense': {}, 'Income': {}}
+    for key, values in zip(keys, grid):
+        type, category = key.split('\0', 1)
+        by_category[type][category] = np.round(values, 2).tolist()
+    return {
+        'currency': currency,
+        'window': window,
+        'months': [f"{index // 12}-{index % 12 + 1:02d}" for index in range(first, first + months)],
+        'income': trend_series(income, window),
+        'expense': trend_series(expense, window),
+        'net': trend_series(income - expense, window),
+        'categories': by_category,
+    }
+
+RECURRING_STEPS = {'daily': (1, 0), 'weekly': (7, 0), 'monthly': (0, 1), 'yearly': (0, 12)}  # (days, months) per interval
+
+def rule_occurrence(rule, n):
+    # Date of the rule's n-th occurrence (0 is start_date); monthly and yearly rules keep the start day,
+    # clamped to the end of shorter months
+    days, months = RECURRING_STEPS[rule.interval]
+    if not months:
+        return rule.start_date + timedelta(days=n * days * rule.every)
+    year, month = divmod(month_index(rule.start_date) + n * months * rule.every, 12)
+    day = min(rule.start_date.day, calendar.monthrange(year, month + 1)[1])
+    return rule.start_date.replace(year=year, month=month + 1, day=day)
+
+def rule_occurrences(rule, start_date, end_date):
+    """Dates of a rule's occurrences in [start_date, end_date), computed on the fly.
+
+    Jumps straight to the first occurrence in range, so a ten-year rule costs the same as a new one.
+    """
+    last_date = rule.end_date if rule.end_date is not None else datetime.max  # inclusive
+    days, months = RECURRING_STEPS[rule.interval]
+    if start_date <= rule.start_date:
+        n = 0
+    elif months:
+        n = (month_index(start_date) - month_index(rule.start_date)) // (months * rule.every)
+    else:
+        n = (start_date - rule.start_date).days // (days * rule.every)
+    try:
+        date = rule_occurrence(rule, n)
+        while date < start_date:
+            n += 1
+            date = rule_occurrence(rule, n)
+        while date < end_date and date <= last_date:
+            yield date
+            n += 1
+            date = rule_occurrence(rule, n)
+    except (OverflowError, ValueError):
+        return  # the next occurrence falls after year 9999, so the series ends there
+
+def get_projected_entries(user_id, start_date, end_date):
+    """Occurrences of the user's recurring rules in [start_date, end_date) that are not rows yet, oldest first.
+
+    All of the user's active rules are read in one query and expanded in memory. Entries carry the rule's id,
+    amount and currency.
+    """
+    rules = RecurringRule.query.filter(RecurringRule.user_id == user_id, RecurringRule.next_date < end_date).all()
+    now = datetime.utcnow() + timedelta(hours=1)
+    entries = []
+    for rule in rules:
+        if rule.next_date < now:
+            # Due but not inserted yet: shown as projected until the materializer catches up
+            schedule_recurring_materialization()
+        entries.extend(LedgerEntry(date, rule.type, rule.id, rule.amount, rule.currency, rule.category, rule.description)
+                       for date in rule_occurrences(rule, max(start_date, rule.next_date), end_date))
+    entries.sort(key=lambda e: (e.date, LEDGER_TYPE_RANK[e.type], e.id))
+    return entries
+
+def materialize_rules(rules, until):
+    """Insert rows for the rules' occurrences dated before `until` and move each rule's next_date past it.
+
+    Rows from all the rules go in one bulk INSERT per table, in the owner's currency at the rate of their date
+    like imports, with rollups, search and budget alerts updated to match. The caller commits and wakes the outbox
+    sender. Returns the number of rows inserted.
+    """
+    if not rules:
+        return 0
+    currencies = dict(db.session.query(User.id, User.currency).filter(User.id.in_(list({rule.user_id for rule in rules}))))
+    timeline = get_rate_timeline()
+    rows = {'Expense': [], 'Income': []}
+    rollup_deltas = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+    for rule in rules:
+        currency = currencies[rule.user_id]
+        for date in rule_occurrences(rule, rule.next_date, until):
+            amount = rule.amount * timeline.rate_at(rule.currency, currency, date)
+            # The import key makes a second insert of the same occurrence fail instead of duplicating it
+            rows[rule.type].append({'user_id': rule.user_id, 'amount': amount, 'currency': currency,
+                                    'category': rule.category, 'description': rule.description, 'date': date,
+                                    'import_key': f"recurring:{rule.id}:{date:%Y%m%d}"})
+            delta = rollup_deltas[rule.user_id][(rule.type, date.year, date.month, rule.category, currency)]
+            delta[0] += amount
+            delta[1] += 1
+        rule.next_date = next(rule_occurrences(rule, until, datetime.max), None)
+    for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+        if rows[type]:
+            ids = db.session.execute(model.__table__.insert().returning(model.id), rows[type]).scalars().all()
+            # SQLite holds the write lock, so nothing else landed in this id range
+            index_for_search(model, type, model.id.between(min(ids), max(ids)))
+    for user_id, deltas in rollup_deltas.items():
+        apply_rollup_deltas(user_id, deltas)
+        check_budget_alerts(user_id, [(year, month, category) for type, year, month, category, currency in deltas
+                                      if type == 'Expense'])
+        bump_data_version(user_id)
+        for year in {key[1] for key in deltas}:
+            note_transaction_year(user_id, year)
+    return sum(len(type_rows) for type_rows in rows.values())
+
+def materialize_due_rules(until=None):
+    # Every occurrence due before `until` (default now), across all users, in committed batches of rules
+    until = until or datetime.utcnow() + timedelta(hours=1)
+    inserted = 0
+    while True:
+        rules = RecurringRule.query.filter(RecurringRule.next_date < until).order_by(RecurringRule.id).limit(
+            current_app.config['RECURRING_BATCH_SIZE']).with_for_update(skip_locked=True).all()
+        if not rules:
+            return inserted
+        batch_inserted = materialize_rules(rules, until)
+        db.session.commit()
+        if batch_inserted:
+            wake_outbox_sender()
+        inserted += batch_inserted
+
+def materialize_due_rules_once():
+    # Single-flight across workers: only the lease holder inserts
+    if not claim_task_lease('materialize_recurring', RECURRING_LEASE):
+        logger.debug("Recurring materialization already claimed by another worker")
+        return None
+    return materialize_due_rules()
+
+def run_recurring_materializer(app):
+    try:
+        with app.app_context():
+            inserted = materialize_due_rules_once()
+            if inserted:
+                logger.info("Materialized %s recurring transactions", inserted)
+    except Exception as e:
+        logger.error(f"Recurring materializer error: {str(e)}")
+
+def schedule_recurring_materialization():
+    if current_app.config['RECURRING_MODE'] != 'thread':
+        return
+    state = current_app.extensions['expense_tracker']
+    with recurring_materializer_lock:
+        if state['recurring_materializer'] is not None and state['recurring_materializer'].is_alive():
+            return
+        # Another worker probably holds the lease if this one started less than a lease ago
+        started = state['recurring_materializer_started']
+        if started is not None and time.monotonic() - started < RECURRING_LEASE.total_seconds():
+            return
+        state['recurring_materializer_started'] = time.monotonic()
+        state['recurring_materializer'] = threading.Thread(target=run_recurring_materializer,
+                                                           args=(current_app._get_current_object(),),
+                                                           name='recurring-materializer', daemon=True)
+        state['recurring_materializer'].start()
+
+def get_request_period():
+    # Period for the API/CSV report: ?start=&end= (inclusive dates) or ?month=&year=
+    now = datetime.utcnow() + timedelta(hours=1)
+    start_date = request.args.get('start', type=parse_date_arg)
+    end_date = request.args.get('end', type=parse_date_arg)
+    # The period ends the day (or year) after the last one asked for, so year 9999 cannot be represented
+    if start_date and end_date and end_date.year < datetime.max.year:
+        return start_date, end_date + timedelta(days=1), f"{start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}"
+    month = request.args.get('month', str(now.month))
+    if month != 'All' and month not in {str(m) for m in range(1, 13)}:
+        month = str(now.month)
+    year = request.args.get('year', now.year, type=int)
+    if not datetime.min.year <= year < datetime.max.year:
+        year = now.year
+    return resolve_report_period(month, year)
+
+def bump_data_version(user_id):
+    # Invalidates the user's cached pages, ETags and cached User; commits with the caller's transaction
+    version = db.session.execute(db.update(User).where(User.id == user_id).values(
+        data_version=User.data_version + 1).returning(User.data_version)).scalar()
+    invalidate_cached_user(user_id)
+    if has_request_context() and current_user.is_authenticated and current_user.id == user_id:
+        session['data_version'] = version
+        session['last_write_at'] = time.time()
+
+def use_read_replica(function):
+    # Route this request's SELECTs to the replica from here on (including streamed responses),
+    # unless the user wrote recently and the replica may not have caught up yet
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if has_request_context() and session.get('last_write_at', 0) <= \
+                time.time() - current_app.config['READ_REPLICA_STICKY_SECONDS']:
+            g.use_read_replica = True
+        return function(*args, **kwargs)
+    return wrapper
+
+def response_cache_key():
+    # Rendered pages embed the session's CSRF token and depend on the current date, so both are part of the key;
+    # the time bucket retires entries before their CSRF tokens expire
+    now = datetime.utcnow() + timedelta(hours=1)
+    bucket = int(time.time() // current_app.config['RESPONSE_CACHE_TTL'])
+    raw = f"{current_user.id}:{current_user.data_version}:{session.get('csrf_token')}:{request.full_path}:{now:%Y-%m-%d}:{bucket}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def cached_page(view):
+    """Serve a user's rendered GET page from memory until their data_version changes, with ETag/304 support."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # A page rendered before the session has a CSRF token would embed a freshly generated one
+        csrf_pending = current_app.config.get('WTF_CSRF_ENABLED', True) and 'csrf_token' not in session
+        if request.method != 'GET' or '_flashes' in session or csrf_pending:
+            response_cache_stats['bypass'] += 1
+            return view(*args, **kwargs)
+        key = response_cache_key()
+        etag = f"{current_user.id}-{current_user.data_version}-{key[:16]}"
+        if request.if_none_match.contains(etag):
+            response_cache_stats['not_modified'] += 1
+            response = Response(status=304)
+        else:
+            body = response_cache.get(key)
+            if body is not None:
+                response_cache_stats['hit'] += 1
+                response = Response(body, mimetype='text/html')
+            else:
+                response_cache_stats['miss'] += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.get('skip_response_cache') or '_flashes' in session:
+                    return response
+                response_cache.set(key, response.get_data())
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+@use_read_replica
 def get_year_choices():
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).all()
-    years = set([e.date.year for e in expenses] + [i.date.year for i in incomes])
+    years = set(get_user_years(current_user.id))
     now = datetime.utcnow() + timedelta(hours=1)
     years.add(now.year)
     return [(str(y), str(y)) for y in sorted(years)]
 
 # Routes
-@app.route('/')
+@bp.route('/metrics')
+def metrics_endpoint():
+    # Metrics name routes and load, so they are off until a token is configured
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        return Response('Metrics are disabled; set METRICS_TOKEN to enable them\n', status=403, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    extra = [(('response_cache_' + name + '_total', ()), value) for name, value in response_cache_stats.items()]
+    extra += [(('user_cache_' + name + '_total', ()), value) for name, value in user_cache_stats.items()]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
@@ -261,35 +2017,39 @@ def register():
         currency = form.currency.data
         if User.query.filter_by(username=username).first() or User.query.filter_by(email=email).first():
             flash('Username or email already exists!')
-            return redirect(url_for('register'))
-        user = User(username=username, email=email, password_hash=generate_password_hash(password), 
+            return redirect(url_for('main.register'))
+        user = User(username=username, email=email, password_hash=hash_password(password), 
                     currency=currency)
         db.session.add(user)
         db.session.commit()
         flash('Registration successful! Please log in.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         username = form.username.data
         password = form.password.data
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password_hash, password):
+        if user and verify_password(user.password_hash, password):
+            if password_needs_rehash(user.password_hash):
+                # Hash parameters changed since this password was stored
+                user.password_hash = hash_password(password)
+                db.session.commit()
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         flash('Invalid username or password!')
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/forgot_password', methods=['GET', 'POST'])
+@bp.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
     form = ForgotPasswordForm()
     if form.validate_on_submit():
@@ -300,90 +2060,97 @@ def forgot_password():
             flash('Password reset email sent! Check your inbox.')
         else:
             flash('Email not found!')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('forgot_password.html', form=form)
 
-@app.route('/reset_password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     try:
         email = serializer.loads(token, salt='password-reset', max_age=1800)
     except:
         flash('The reset link is invalid or has expired.')
-        return redirect(url_for('forgot_password'))
+        return redirect(url_for('main.forgot_password'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=email).first()
-        user.password_hash = generate_password_hash(form.password.data)
+        user.password_hash = hash_password(form.password.data)
         db.session.commit()
+        invalidate_cached_user(user.id)
         flash('Password reset successfully! Please log in.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('reset_password.html', form=form, token=token)
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
+@cached_page
+@use_read_replica
 def dashboard():
     now = datetime.utcnow() + timedelta(hours=1)
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     next_month = (month_start + timedelta(days=32)).replace(day=1)
     
-    expenses = Expense.query.filter_by(user_id=current_user.id).filter(
-        Expense.date >= month_start, Expense.date < next_month).order_by(Expense.date.desc()).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).filter(
-        Income.date >= month_start, Income.date < next_month).order_by(Income.date.desc()).all()
-    
     currency = current_user.currency
     symbol = get_currency_symbol(currency)
     
-    total_spent = sum(expense.amount for expense in expenses if expense.currency == currency)
-    total_income = sum(income.amount for income in incomes if income.currency == currency)
-    balance = total_income - total_spent
-    
-    transactions = [(expense, expense.amount, 'Expense') for expense in expenses if expense.currency == currency] + \
-                   [(income, income.amount, 'Income') for income in incomes if income.currency == currency]
-    transactions = sorted(transactions, key=lambda x: x[0].date, reverse=True)
+    report = build_report(current_user.id, currency, month_start, next_month,
+                          after=request.args.get('after'), before=request.args.get('before'))
     
+    # Budget vs. actual from the month's category totals already in the report: no per-category queries
+    budgets = [(budget, report.expense_totals.get(budget.category, 0.0))
+               for budget in Budget.query.filter_by(user_id=current_user.id).order_by(Budget.category)]
+
+    conversion = get_active_conversion(current_user.id)
+    if conversion:
+        g.skip_response_cache = True  # progress changes without a data_version bump
     currency_form = UpdateCurrencyForm(currency=currency)
     return render_template(
         'dashboard.html',
-        transactions=transactions,
-        total_spent=total_spent,
-        balance=balance,
+        conversion=conversion,
+        ledger=report.ledger,
+        total_spent=report.total_spent,
+        balance=report.balance,
         currency_symbol=symbol,
-        total_income=total_income,
+        total_income=report.total_income,
+        projected=report.projected,
+        projected_spent=report.projected_spent,
+        projected_income=report.projected_income,
+        budgets=budgets,
         currency_form=currency_form,
         month=now.strftime('%B %Y')
     )
 
-@app.route('/update_currency', methods=['POST'])
+@bp.route('/update_currency', methods=['POST'])
 @login_required
 def update_currency():
     form = UpdateCurrencyForm()
     if form.validate_on_submit():
         old_currency = current_user.currency
         new_currency = form.currency.data
-        logger.debug(f"Updating currency from {old_currency} to {new_currency} for user {current_user.id}")
-        if old_currency != new_currency:
+        logger.debug("Updating currency from %s to %s for user %s", old_currency, new_currency, current_user.id)
+        if get_active_conversion(current_user.id):
+            flash('A currency conversion is already in progress.', 'error')
+        elif old_currency != new_currency:
             try:
-                # Convert existing expenses
-                expenses = Expense.query.filter_by(user_id=current_user.id, currency=old_currency).all()
-                logger.debug(f"Found {len(expenses)} expenses to convert")
-                for expense in expenses:
-                    new_amount = convert_currency(expense.amount, old_currency, new_currency)
-                    logger.debug(f"Converting expense {expense.id}: {expense.amount} {old_currency} to {new_amount} {new_currency}")
-                    expense.amount = new_amount
-                    expense.currency = new_currency
-                # Convert existing incomes
-                incomes = Income.query.filter_by(user_id=current_user.id, currency=old_currency).all()
-                logger.debug(f"Found {len(incomes)} incomes to convert")
-                for income in incomes:
-                    new_amount = convert_currency(income.amount, old_currency, new_currency)
-                    logger.debug(f"Converting income {income.id}: {income.amount} {old_currency} to {new_amount} {new_currency}")
-                    income.amount = new_amount
-                    income.currency = new_currency
-                # Update user's currency
-                current_user.currency = new_currency
-                db.session.commit()
-                flash(f'Currency updated to {new_currency}. All transactions converted.')
+                rate = get_exchange_rate(old_currency, new_currency)
+                total_rows = count_convertible_rows(current_user.id, old_currency)
+                if total_rows > current_app.config['CURRENCY_CONVERSION_BACKGROUND_THRESHOLD']:
+                    # Large histories are converted in chunks off the request thread
+                    job = CurrencyConversion(user_id=current_user.id, old_currency=old_currency,
+                                             new_currency=new_currency, rate=rate, total_rows=total_rows)
+                    db.session.add(job)
+                    db.session.commit()
+                    start_currency_conversion(job.id)
+                    flash(f'Converting {total_rows} transactions to {new_currency} in the background.')
+                else:
+                    for model in (Expense, Income):
+                        convert_transaction_rows(model, current_user.id, old_currency, new_currency, rate)
+                    convert_rollups(current_user.id, old_currency, new_currency, rate)
+                    convert_budgets(current_user.id, rate)
+                    # Update user's currency
+                    db.session.execute(db.update(User).where(User.id == current_user.id).values(currency=new_currency))
+                    bump_data_version(current_user.id)
+                    db.session.commit()
+                    flash(f'Currency updated to {new_currency}. All transactions converted.')
             except Exception as e:
                 db.session.rollback()
                 logger.error(f"Error updating currency: {str(e)}")
@@ -394,9 +2161,18 @@ def update_currency():
         for field, errors in form.errors.items():
             for error in errors:
                 flash(f'Error in {field}: {error}', 'error')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/update_currency/status')
+@login_required
+def update_currency_status():
+    job = CurrencyConversion.query.filter_by(user_id=current_user.id).order_by(CurrencyConversion.id.desc()).first()
+    if job is None:
+        return jsonify(status='none')
+    return jsonify(status=job.status, old_currency=job.old_currency, new_currency=job.new_currency,
+                   converted_rows=job.converted_rows, total_rows=job.total_rows)
 
-@app.route('/add_expense', methods=['GET', 'POST'])
+@bp.route('/add_expense', methods=['GET', 'POST'])
 @login_required
 def add_expense():
     form = AddExpenseForm()
@@ -414,12 +2190,20 @@ def add_expense():
             date=date
         )
         db.session.add(expense)
+        db.session.flush()
+        index_for_search(Expense, 'Expense', Expense.id == expense.id)
+        update_rollup(current_user.id, 'Expense', date, category, expense.currency, amount)
+        alerted = check_budget_alerts(current_user.id, [(date.year, date.month, category)])
+        bump_data_version(current_user.id)
         db.session.commit()
+        note_transaction_year(current_user.id, date.year)
+        if alerted:
+            wake_outbox_sender()
         flash('Expense added successfully!')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('add_expense.html', form=form, currency_symbol=get_currency_symbol(current_user.currency))
 
-@app.route('/add_income', methods=['GET', 'POST'])
+@bp.route('/add_income', methods=['GET', 'POST'])
 @login_required
 def add_income():
     form = AddIncomeForm()
@@ -437,13 +2221,98 @@ def add_income():
             date=date
         )
         db.session.add(income)
+        db.session.flush()
+        index_for_search(Income, 'Income', Income.id == income.id)
+        update_rollup(current_user.id, 'Income', date, category, income.currency, amount)
+        bump_data_version(current_user.id)
         db.session.commit()
+        note_transaction_year(current_user.id, date.year)
         flash('Income added successfully!')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('add_income.html', form=form, currency_symbol=get_currency_symbol(current_user.currency))
 
-@app.route('/financial_report', methods=['GET', 'POST'])
+@bp.route('/recurring', methods=['GET', 'POST'])
 @login_required
+def recurring_rules():
+    form = RecurringRuleForm(currency=current_user.currency)
+    if form.validate_on_submit():
+        start_date = datetime.combine(form.start_date.data, datetime.min.time())
+        rule = RecurringRule(
+            user_id=current_user.id,
+            type=form.type.data,
+            amount=form.amount.data,
+            currency=form.currency.data,
+            category=form.category.data,
+            description=form.description.data or None,
+            interval=form.interval.data,
+            every=form.every.data,
+            start_date=start_date,
+            end_date=datetime.combine(form.end_date.data, datetime.min.time()) if form.end_date.data else None,
+            next_date=start_date
+        )
+        db.session.add(rule)
+        db.session.flush()
+        # Occurrences already due (a start date in the past) are recorded now; later ones stay projected
+        inserted = materialize_rules([rule], datetime.utcnow() + timedelta(hours=1))
+        bump_data_version(current_user.id)
+        db.session.commit()
+        if inserted:
+            wake_outbox_sender()
+        flash('Recurring transaction added!')
+        return redirect(url_for('main.recurring_rules'))
+    rules = RecurringRule.query.filter_by(user_id=current_user.id).order_by(RecurringRule.id).all()
+    return render_template('recurring.html', form=form, rules=rules)
+
+@bp.route('/delete_recurring/<int:id>')
+@login_required
+def delete_recurring(id):
+    rule = RecurringRule.query.get_or_404(id)
+    if rule.user_id == current_user.id:
+        db.session.delete(rule)
+        bump_data_version(current_user.id)
+        db.session.commit()
+        flash('Recurring transaction stopped; transactions already recorded are kept.')
+    return redirect(url_for('main.recurring_rules'))
+
+@bp.route('/budgets', methods=['GET', 'POST'])
+@login_required
+def budgets():
+    form = BudgetForm()
+    if form.validate_on_submit():
+        budget = Budget.query.filter_by(user_id=current_user.id, category=form.category.data).first()
+        if budget is None:
+            budget = Budget(user_id=current_user.id, category=form.category.data)
+            db.session.add(budget)
+        budget.amount = form.amount.data
+        budget.alerted_month, budget.alerted_level = None, 0
+        # Spend may already be past a level of the new amount
+        now = datetime.utcnow() + timedelta(hours=1)
+        alerted = check_budget_alerts(current_user.id, [(now.year, now.month, budget.category)])
+        bump_data_version(current_user.id)
+        db.session.commit()
+        if alerted:
+            wake_outbox_sender()
+        flash(f'{budget.category} budget set to {get_currency_symbol(current_user.currency)}{budget.amount:.2f} a month.')
+        return redirect(url_for('main.budgets'))
+    user_budgets = Budget.query.filter_by(user_id=current_user.id).order_by(Budget.category).all()
+    return render_template('budgets.html', form=form, budgets=user_budgets,
+                           currency_symbol=get_currency_symbol(current_user.currency))
+
+@bp.route('/delete_budget/<int:id>')
+@login_required
+def delete_budget(id):
+    budget = Budget.query.get_or_404(id)
+    if budget.user_id == current_user.id:
+        db.session.delete(budget)
+        bump_data_version(current_user.id)
+        db.session.commit()
+        flash('Budget removed!')
+    return redirect(url_for('main.budgets'))
+
+@bp.route('/financial_report', methods=['GET', 'POST'])
+@login_required
+@cached_page
+@use_read_replica
 def financial_report():
     form = PeriodForm()
     now = datetime.utcnow() + timedelta(hours=1)
@@ -451,75 +2320,48 @@ def financial_report():
     # populate year choices based on user's data
     form.year.choices = get_year_choices()
 
+    # pagination links carry the period in the query string
+    if request.method == 'GET':
+        if request.args.get('month') in dict(form.month.choices):
+            form.month.data = request.args['month']
+        if request.args.get('year') in dict(form.year.choices):
+            form.year.data = request.args['year']
+
     # --- DO NOT overwrite posted values ---
     # only set defaults when the form does not already have values (i.e., on initial GET)
-    if not form.month.data:
+    # or holds one that is not among the choices
+    if form.month.data not in dict(form.month.choices):
         form.month.data = str(now.month)
-    if not form.year.data:
+    if form.year.data not in dict(form.year.choices):
         form.year.data = str(now.year)
 
     # read selected values (either submitted or defaults)
     month = form.month.data
     year = form.year.data
 
-    # convert to ints where needed
-    year = int(year)
-    if month == 'All':
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year + 1, 1, 1)
-        period_display = f"Year: {year}"
-    else:
-        month = int(month)
-        start_date = datetime(year, month, 1)
-        # safe next-month calc
-        end_date = (start_date + timedelta(days=32)).replace(day=1)
-        period_display = start_date.strftime('%B %Y')
-
+    start_date, end_date, period_display = resolve_report_period(month, int(year))
     currency = current_user.currency
     symbol = get_currency_symbol(currency)
 
-    # fetch transactions for the chosen period and currency
-    expenses = Expense.query.filter_by(user_id=current_user.id).filter(
-        Expense.date >= start_date, Expense.date < end_date, Expense.currency == currency
-    ).order_by(Expense.date.desc()).all()
-
-    incomes = Income.query.filter_by(user_id=current_user.id).filter(
-        Income.date >= start_date, Income.date < end_date, Income.currency == currency
-    ).order_by(Income.date.desc()).all()
-
-    converted_expenses = [(e, e.amount) for e in expenses]
-    converted_incomes = [(i, i.amount) for i in incomes]
-
-    # Expense chart data
-    expense_chart_data = db.session.query(
-        Expense.category, db.func.sum(Expense.amount)
-    ).filter_by(user_id=current_user.id).filter(
-        Expense.date >= start_date, Expense.date < end_date, Expense.currency == currency
-    ).group_by(Expense.category).all()
-    expense_chart_labels = [cat[0] for cat in expense_chart_data]
-    expense_chart_values = [float(cat[1]) for cat in expense_chart_data]
-
-    # Income chart data
-    income_chart_data = db.session.query(
-        Income.category, db.func.sum(Income.amount)
-    ).filter_by(user_id=current_user.id).filter(
-        Income.date >= start_date, Income.date < end_date, Income.currency == currency
-    ).group_by(Income.category).all()
-    income_chart_labels = [cat[0] for cat in income_chart_data]
-    income_chart_values = [float(cat[1]) for cat in income_chart_data]
-
-    if not expenses and not incomes:
+    report = build_report(current_user.id, currency, start_date, end_date,
+                          after=request.args.get('after'), before=request.args.get('before'))
+
+    if not report.ledger.entries:
         flash('No transactions found for the selected period.', 'warning')
 
     return render_template(
         'financial_report.html',
         form=form,
-        expenses=converted_expenses,
-        incomes=converted_incomes,
-        expense_chart_labels=expense_chart_labels,
-        expense_chart_values=expense_chart_values,
-        income_chart_labels=income_chart_labels,
-        income_chart_values=income_chart_values,
+        ledger=report.ledger,
+        total_spent=report.total_spent,
+        total_income=report.total_income,
+        expense_chart_labels=list(report.expense_totals.keys()),
+        expense_chart_values=list(report.expense_totals.values()),
+        income_chart_labels=list(report.income_totals.keys()),
+        income_chart_values=list(report.income_totals.values()),
+        projected=report.projected,
+        projected_spent=report.projected_spent,
+        projected_income=report.projected_income,
         period=period_display,
         currency_symbol=symbol,
         start_date=start_date.strftime('%Y-%m-%d'),
@@ -527,45 +2369,526 @@ def financial_report():
     )
 
 
-@app.route('/delete_expense/<int:id>')
+@bp.route('/api/report')
+@login_required
+@use_read_replica
+def report_api():
+    start_date, end_date, period_display = get_request_period()
+    report = build_report(current_user.id, current_user.currency, start_date, end_date,
+                          after=request.args.get('after'), before=request.args.get('before'))
+    return jsonify(
+        period=period_display,
+        start_date=start_date.strftime('%Y-%m-%d'),
+        end_date=(end_date - timedelta(days=1)).strftime('%Y-%m-%d'),
+        currency=report.currency,
+        total_spent=report.total_spent,
+        total_income=report.total_income,
+        balance=report.balance,
+        expense_categories=report.expense_totals,
+        income_categories=report.income_totals,
+        transactions=[dict(entry._asdict(), date=entry.date.strftime('%Y-%m-%d')) for entry in report.ledger.entries],
+        next_cursor=report.ledger.next_cursor,
+        prev_cursor=report.ledger.prev_cursor,
+        projected_spent=report.projected_spent,
+        projected_income=report.projected_income,
+        projected=[dict(entry._asdict(), date=entry.date.strftime('%Y-%m-%d')) for entry in report.projected],
+    )
+
+@bp.route('/api/trends')
+@login_required
+@use_read_replica
+def trends_api():
+    # ?start=YYYY-MM&end=YYYY-MM (inclusive) or ?months=N ending at ?end/this month; ?window=N for rolling averages
+    now = datetime.utcnow() + timedelta(hours=1)
+    end_month = request.args.get('end', type=parse_month_arg) or datetime(now.year, now.month, 1)
+    start_month = request.args.get('start', type=parse_month_arg)
+    if start_month is not None and start_month <= end_month:
+        months = month_index(end_month) - month_index(start_month) + 1
+    else:
+        months = request.args.get('months', 12, type=int)
+    # Never start before January of year 1, the earliest month datetime can hold
+    months = min(max(months, 1), current_app.config['TRENDS_MAX_MONTHS'],
+                 month_index(end_month) - month_index(datetime.min) + 1)
+    first = month_index(end_month) - months + 1
+    window = min(max(request.args.get('window', 3, type=int), 1), months)
+    return jsonify(build_trends(current_user.id, current_user.currency, datetime(first // 12, first % 12 + 1, 1),
+                                months, window))
+
+def get_search_page(form):
+    # Runs the search described by a validated SearchForm and the ?page argument
+    # (an end on the last representable day has no next day and is the same as no end)
+    end_date = datetime.combine(form.end.data, datetime.min.time()) + timedelta(days=1) \
+        if form.end.data and form.end.data < datetime.max.date() else None
+    return search_transactions(
+        current_user.id, form.q.data, type=form.type.data or None, category=(form.category.data or '').strip() or None,
+        min_amount=form.min_amount.data, max_amount=form.max_amount.data,
+        start_date=datetime.combine(form.start.data, datetime.min.time()) if form.start.data else None,
+        end_date=end_date, page=min(max(request.args.get('page', 1, type=int), 1), SEARCH_MAX_PAGE))
+
+@bp.route('/search')
+@login_required
+@use_read_replica
+def search():
+    # ?q= free text plus optional type, category, min_amount/max_amount and start/end (inclusive) filters
+    form = SearchForm(request.args)
+    results = None
+    if request.args:
+        if form.validate():
+            results = get_search_page(form)
+        else:
+            for field, errors in form.errors.items():
+                for error in errors:
+                    flash(f'Error in {field}: {error}', 'error')
+    query_args = {key: value for key, value in request.args.items() if key != 'page' and value}
+    return render_template('search.html', form=form, results=results, query_args=query_args)
+
+@bp.route('/api/search')
+@login_required
+@use_read_replica
+def search_api():
+    form = SearchForm(request.args)
+    if not form.validate():
+        return jsonify(errors=form.errors), 400
+    results = get_search_page(form)
+    return jsonify(
+        page=results.page,
+        has_more=results.has_more,
+        transactions=[dict(entry._asdict(), date=entry.date.strftime('%Y-%m-%d')) for entry in results.entries],
+    )
+
+@bp.route('/financial_report/export')
+@login_required
+@use_read_replica
+def export_report():
+    start_date, end_date, period_display = get_request_period()
+    report = build_report(current_user.id, current_user.currency, start_date, end_date, with_ledger=False)
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Type', 'Category', 'Amount', 'Currency'])
+    for type, totals in (('Income', report.income_totals), ('Expense', report.expense_totals)):
+        for category, total in totals.items():
+            writer.writerow([type, category, round(total, 2), report.currency])
+    writer.writerow(['Total Income', '', round(report.total_income, 2), report.currency])
+    writer.writerow(['Total Spent', '', round(report.total_spent, 2), report.currency])
+    writer.writerow(['Balance', '', round(report.balance, 2), report.currency])
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=report_{start_date:%Y-%m-%d}_{report.currency}.csv'}
+    )
+
+@bp.route('/delete_expense/<int:id>')
 @login_required
 def delete_expense(id):
     expense = Expense.query.get_or_404(id)
     if expense.user_id == current_user.id:
         db.session.delete(expense)
+        unindex_for_search('Expense', expense.id)
+        update_rollup(expense.user_id, 'Expense', expense.date, expense.category, expense.currency, -expense.amount, -1)
+        bump_data_version(current_user.id)
         db.session.commit()
+        forget_user_years(current_user.id)
         flash('Expense deleted!')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/delete_income/<int:id>')
+@bp.route('/delete_income/<int:id>')
 @login_required
 def delete_income(id):
     income = Income.query.get_or_404(id)
     if income.user_id == current_user.id:
         db.session.delete(income)
+        unindex_for_search('Income', income.id)
+        update_rollup(income.user_id, 'Income', income.date, income.category, income.currency, -income.amount, -1)
+        bump_data_version(current_user.id)
         db.session.commit()
+        forget_user_years(current_user.id)
         flash('Income deleted!')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+def iter_transactions(user_id, start_date=None, end_date=None, types=('Expense', 'Income'), yield_per=1000):
+    # Merge the per-table date-ordered cursors into one stream of (date, id, type, amount, currency, category, description)
+    streams = []
+    for model, type in ((Expense, 'Expense'), (Income, 'Income')):
+        if type not in types:
+            continue
+        query = db.select(model.date, model.id, db.literal(type), model.amount, model.currency,
+                          model.category, model.description).where(model.user_id == user_id)
+        if start_date is not None:
+            query = query.where(model.date >= start_date)
+        if end_date is not None:
+            query = query.where(model.date < end_date)
+        query = query.order_by(model.date, model.id).execution_options(yield_per=yield_per)
+        streams.append(db.session.execute(query))
+    return heapq.merge(*streams, key=lambda row: (row[0], row[1]))
+
+def iter_csv(rows, flush_size=64 * 1024):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['ID', 'Type', 'Amount', 'Currency', 'Category', 'Description', 'Date'])
+    for date, id, type, amount, currency, category, description in rows:
+        writer.writerow([id, type, amount, currency, category, description, date.strftime('%Y-%m-%d')])
+        if buffer.tell() >= flush_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def parse_date_arg(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def parse_month_arg(value):
+    return datetime.strptime(value, '%Y-%m')
+
+ImportResult = namedtuple('ImportResult', 'imported skipped failed errors')
+IMPORT_MODELS = {'Expense': Expense, 'Income': Income}
+IMPORT_COLUMNS = ['user_id', 'amount', 'currency', 'category', 'description', 'date', 'import_key']
+
+def iter_import_records(stream, format='csv'):
+    # Yields one dict per row using the export_expenses column names, reading the upload incrementally
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    if first == '[':
+        # A JSON array has to be parsed whole; JSON Lines streams
+        yield from json.loads(first + text.read())
+        return
+    for line in itertools.chain([first + text.readline()], text):
+        if line.strip():
+            yield json.loads(line)
+
+def parse_import_record(record, user_currency, timeline):
+    type = str(record.get('Type', '')).strip().capitalize()
+    if type not in IMPORT_MODELS:
+        raise ValueError(f"unknown type {record.get('Type')!r}")
+    try:
+        amount = float(record.get('Amount'))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid amount {record.get('Amount')!r}")
+    if not amount >= 0.01:
+        raise ValueError('amount must be at least 0.01')
+    currency = str(record.get('Currency') or user_currency).strip().upper()
+    if currency not in SUPPORTED_CURRENCIES:
+        raise ValueError(f"unsupported currency {currency!r}")
+    category = str(record.get('Category') or '').strip()
+    if not category or len(category) > 50:
+        raise ValueError('category must be 1-50 characters')
+    description = str(record.get('Description') or '') or None
+    if description is not None and len(description) > 200:
+        raise ValueError('description is longer than 200 characters')
+    try:
+        date = datetime.fromisoformat(str(record.get('Date', ''))[:10])
+    except ValueError:
+        raise ValueError(f"invalid date {record.get('Date')!r}")
+    source = f"{type}|{record.get('ID', '')}|{amount!r}|{currency}|{category}|{description}|{date:%Y-%m-%d}"
+    # Amounts are stored in the user's currency, like every other transaction, at the rate of their date
+    row = {'amount': amount * timeline.rate_at(currency, user_currency, date), 'currency': user_currency,
+           'category': category, 'description': description, 'date': date}
+    return type, source, row
+
+def copy_import_rows(model, rows):
+    # PostgreSQL fast path: stream the batch through COPY FROM STDIN on the session's connection
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in IMPORT_COLUMNS])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def insert_import_batch(user_id, batch):
+    # Insert rows whose import_key is new; returns (imported, skipped)
+    imported = skipped = 0
+    use_copy = current_app.config['IMPORT_USE_COPY'] and db.engine.dialect.name == 'postgresql'
+    rollup_deltas = defaultdict(lambda: [0.0, 0])
+    for type, rows in batch.items():
+        if not rows:
+            continue
+        model = IMPORT_MODELS[type]
+        keys = [row['import_key'] for row in rows]
+        existing = set(db.session.execute(db.select(model.import_key).where(
+            model.user_id == user_id, model.import_key.in_(keys))).scalars())
+        new_rows = [row for row in rows if row['import_key'] not in existing]
+        skipped += len(rows) - len(new_rows)
+        if not new_rows:
+            continue
+        if use_copy:
+            copy_import_rows(model, new_rows)
+        else:
+            db.session.execute(model.__table__.insert(), new_rows)
+        index_for_search(model, type, model.user_id == user_id,
+                         model.import_key.in_([row['import_key'] for row in new_rows]))
+        imported += len(new_rows)
+        for row in new_rows:
+            delta = rollup_deltas[(type, row['date'].year, row['date'].month, row['category'], row['currency'])]
+            delta[0] += row['amount']
+            delta[1] += 1
+    apply_rollup_deltas(user_id, rollup_deltas)
+    alerted = check_budget_alerts(user_id, [(year, month, category) for type, year, month, category, currency
+                                            in rollup_deltas if type == 'Expense'])
+    if imported:
+        bump_data_version(user_id)
+    db.session.commit()
+    if alerted:
+        wake_outbox_sender()
+    for year in {key[1] for key in rollup_deltas}:
+        note_transaction_year(user_id, year)
+    return imported, skipped
+
+def import_transactions(user, stream, format='csv', batch_size=None):
+    """Bulk-load transactions in the export_expenses layout; re-importing the same file is a no-op."""
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    timeline = get_rate_timeline()
+    occurrences = Counter()
+    imported = skipped = failed = 0
+    errors = []
+    batch = {'Expense': [], 'Income': []}
+    pending = 0
+
+    def flush(batch, pending):
+        # Returns (imported, skipped, failed). When a concurrent import of the same file commits some of these
+        # rows first, the unique import_key index rejects the batch: retry it once so they count as skipped
+        unique_violations = (IntegrityError, getattr(db.engine.dialect.dbapi, 'IntegrityError', IntegrityError))
+        for _ in range(2):
+            try:
+                return (*insert_import_batch(user.id, batch), 0)
+            except unique_violations:
+                db.session.rollback()
+        if len(errors) < 20:
+            errors.append(f"{pending} rows were being imported concurrently and were not loaded; import the file again")
+        return 0, 0, pending
+
+    for number, record in enumerate(iter_import_records(stream, format), start=1):
+        try:
+            type, source, row = parse_import_record(record, user.currency, timeline)
+        except (ValueError, TypeError, AttributeError) as e:
+            failed += 1
+            if len(errors) < 20:
+                errors.append(f"Row {number}: {e}")
+            continue
+        # Identical rows in one file stay distinct through their occurrence number
+        occurrences[source] += 1
+        row['user_id'] = user.id
+        row['import_key'] = hashlib.sha1(f"{source}|{occurrences[source]}".encode('utf-8')).hexdigest()
+        batch[type].append(row)
+        pending += 1
+        if pending >= batch_size:
+            counts = flush(batch, pending)
+            imported, skipped, failed = imported + counts[0], skipped + counts[1], failed + counts[2]
+            batch = {'Expense': [], 'Income': []}
+            pending = 0
+    counts = flush(batch, pending)
+    return ImportResult(imported + counts[0], skipped + counts[1], failed + counts[2], errors)
 
-@app.route('/export_expenses')
+@bp.route('/import_transactions', methods=['GET', 'POST'])
 @login_required
+def import_transactions_view():
+    form = ImportForm()
+    if form.validate_on_submit():
+        try:
+            result = import_transactions(current_user, form.file.data.stream, form.format.data)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not read the file: {str(e)}', 'error')
+            return redirect(url_for('main.import_transactions_view'))
+        flash(f'Imported {result.imported} transactions ({result.skipped} already present, {result.failed} invalid).')
+        for error in result.errors:
+            flash(error, 'error')
+        return redirect(url_for('main.dashboard'))
+    return render_template('import_transactions.html', form=form)
+
+@bp.route('/export_expenses')
+@login_required
+@use_read_replica
 def export_expenses():
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).all()
+    # Optional filters: ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive), ?type=expense|income, ?gzip=1
+    start_date = request.args.get('start', type=parse_date_arg)
+    end_date = request.args.get('end', type=parse_date_arg)
+    if end_date is not None:
+        end_date += timedelta(days=1)
+    type = request.args.get('type', '').capitalize()
+    types = (type,) if type in ('Expense', 'Income') else ('Expense', 'Income')
     currency = current_user.currency
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Type', 'Amount', 'Currency', 'Category', 'Description', 'Date'])
-    for expense in expenses:
-        writer.writerow([expense.id, 'Expense', expense.amount, expense.currency, expense.category, expense.description, expense.date.strftime('%Y-%m-%d')])
-    for income in incomes:
-        writer.writerow([income.id, 'Income', income.amount, income.currency, income.category, income.description, income.date.strftime('%Y-%m-%d')])
-    output.seek(0)
+    chunks = iter_csv(iter_transactions(current_user.id, start_date, end_date, types))
+    filename = f'transactions_{currency}.csv'
+    if request.args.get('gzip'):
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv'
     return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=transactions_{currency}.csv'}
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
+@bp.cli.command('rebuild-rollups')
+@click.option('--verify-only', is_flag=True, help='Report drift without rewriting the rollup table.')
+def rebuild_rollups_command(verify_only):
+    """Recompute monthly category rollups from raw transactions and report drift."""
+    drift = rebuild_rollups(verify_only=verify_only)
+    for key, have, want in sorted(drift):
+        click.echo(f"{key}: stored total={have[0]:.2f} count={have[1]}, actual total={want[0]:.2f} count={want[1]}")
+    action = 'found' if verify_only else 'repaired'
+    click.echo(f"{len(drift)} drifted rollup rows {action}.")
+    if verify_only and drift:
+        raise SystemExit(1)
+
+@bp.cli.command('run-currency-conversions')
+def run_currency_conversions_command():
+    """Resume unfinished background currency conversions."""
+    jobs = CurrencyConversion.query.filter(CurrencyConversion.status.in_(['pending', 'running', 'failed'])).all()
+    for job in jobs:
+        click.echo(f"Converting user {job.user_id} from {job.old_currency} to {job.new_currency} "
+                   f"({job.converted_rows}/{job.total_rows} rows done)")
+        run_currency_conversion(job.id)
+        click.echo(f"  {db.session.get(CurrencyConversion, job.id).status}")
+
+@bp.cli.command('import-transactions')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'json']), default='csv')
+def import_transactions_command(username, path, format):
+    """Import a CSV/JSON file in the export layout into USERNAME's account."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username}")
+    started = time.perf_counter()
+    with open(path, 'rb') as stream:
+        result = import_transactions(user, stream, format)
+    elapsed = time.perf_counter() - started
+    for error in result.errors:
+        click.echo(error, err=True)
+    click.echo(f"Imported {result.imported}, skipped {result.skipped} duplicates, {result.failed} invalid "
+               f"in {elapsed:.1f}s")
+
+@bp.cli.command('refresh-rates')
+@click.option('--loop', is_flag=True, help='Keep checking every few minutes instead of exiting.')
+@click.option('--force', is_flag=True, help='Fetch even if the stored rates are fresh.')
+def refresh_rates_command(loop, force):
+    """Fetch exchange rates when the stored ones are stale."""
+    while True:
+        if force:
+            click.echo('Exchange rates refreshed.' if refresh_rates() else 'Exchange rate refresh failed.')
+        elif not RateSnapshot.load().is_fresh():
+            click.echo('Exchange rates refreshed.' if refresh_rates_once() else 'Exchange rates not refreshed.')
+        if not loop:
+            break
+        db.session.remove()
+        time.sleep(RATE_RETRY_INTERVAL.total_seconds())
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Repopulate the SQLite full-text search table from the transactions."""
+    indexed = rebuild_search_index()
+    if indexed is None:
+        click.echo('PostgreSQL maintains its search indexes itself; nothing to do.')
+    else:
+        click.echo(f"Indexed {indexed} transaction descriptions.")
+
+@bp.cli.command('materialize-recurring')
+@click.option('--loop', is_flag=True, help='Keep running every RECURRING_POLL_INTERVAL seconds instead of exiting.')
+def materialize_recurring_command(loop):
+    """Record every recurring transaction that has fallen due, for all users."""
+    while True:
+        inserted = materialize_due_rules_once()
+        if inserted is None:
+            click.echo('Another worker is materializing recurring transactions.')
+        else:
+            click.echo(f"Recorded {inserted} recurring transactions.")
+        if not loop:
+            break
+        db.session.remove()
+        time.sleep(current_app.config['RECURRING_POLL_INTERVAL'])
+
+@bp.cli.command('compact-rates')
+def compact_rates_command():
+    """Thin the exchange-rate history to one rate per currency per day."""
+    deleted = compact_exchange_rates()
+    click.echo(f"Deleted {deleted} superseded exchange rates.")
+
+@bp.cli.command('send-mail')
+@click.option('--loop', is_flag=True, help='Keep polling the outbox instead of exiting when it is empty.')
+def send_mail_command(loop):
+    """Deliver queued outbox mail."""
+    while True:
+        sent = 0
+        while True:
+            attempted = deliver_outbox()
+            if not attempted:
+                break
+            sent += attempted
+        if sent:
+            click.echo(f"Attempted {sent} messages.")
+        if not loop:
+            break
+        time.sleep(current_app.config['MAIL_OUTBOX_POLL_INTERVAL'])
+
+def create_app(config=None):
+    """Build the app: configuration from the environment (then `config`), extensions, caches and routes.
+
+    Heavy dependencies stay unimported until first used; call warm_up() in a gunicorn --preload parent to load
+    them once before workers fork.
+    """
+    load_dotenv()
+    # Debug messages use lazy %-formatting so they cost only a level check when disabled
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+    app = Flask(__name__)
+    load_config(app, config)
+    db.init_app(app)
+    instrument_engines(app)
+    login_manager.init_app(app)
+    if os.getenv('FLASK_RUN_FROM_CLI'):
+        # Only the `flask db` commands need Flask-Migrate (and Alembic)
+        from flask_migrate import Migrate
+        Migrate(app, db, include_object=include_in_autogenerate)
+    init_app_state(app)
+    app.register_blueprint(bp)
+    forked_apps.add(app)
+    return app
+
+forked_apps = weakref.WeakSet()  # Apps whose engine pools are dropped in forked children
+
+def dispose_engines_after_fork():
+    # A preloaded parent may have connected (e.g. in warm_up or a preload hook); children open their own
+    # connections instead of sharing its sockets, and leave the parent's to the parent
+    for app in list(forked_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_engines_after_fork)
+
+def warm_up(app):
+    # Import what requests otherwise load on first use and compile every template, without touching the
+    # database, so forked workers start with all of it in shared memory
+    import numpy  # noqa: F401
+    import requests  # noqa: F401
+    import flask_mail  # noqa: F401
+    import concurrent.futures.process  # noqa: F401
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def __getattr__(name):
+    # `expense_tracker_app:app` (gunicorn, FLASK_APP, scripts) keeps working: the default app is built on
+    # first access and then cached as a regular module attribute
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
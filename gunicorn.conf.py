@@ -0,0 +1,15 @@
+# gunicorn settings, used by the Procfile: `gunicorn -c gunicorn.conf.py 'expense_tracker_app:create_app()'`
+import os
+
+# Build the app once in the master and fork workers from it, so each worker starts warm instead of importing
+# and configuring everything itself. Set GUNICORN_PRELOAD=0 to load the app in every worker (e.g. to make
+# `kill -HUP` pick up code changes).
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # Runs in the master before the first fork; with preload, load the lazily imported dependencies and
+    # compile the templates there too
+    if server.cfg.preload_app:
+        from expense_tracker_app import warm_up
+        warm_up(server.app.wsgi())
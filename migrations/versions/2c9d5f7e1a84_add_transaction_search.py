@@ -0,0 +1,42 @@
+"""Add full-text search over transaction descriptions
+
+Revision ID: 2c9d5f7e1a84
+Revises: 1b8f4e6a2c70
+Create Date: 2026-10-17 20:11:47.208913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9d5f7e1a84'
+down_revision = '1b8f4e6a2c70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # FTS5 table maintained by the app; rowid is id * 2 + (0 for expenses, 1 for incomes)
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS transaction_search USING fts5(description, owner, "
+                   "tokenize='unicode61 remove_diacritics 2')")
+        op.execute("INSERT INTO transaction_search (rowid, description, owner) "
+                   "SELECT id * 2, description, 'u' || user_id FROM expense WHERE description IS NOT NULL")
+        op.execute("INSERT INTO transaction_search (rowid, description, owner) "
+                   "SELECT id * 2 + 1, description, 'u' || user_id FROM income WHERE description IS NOT NULL")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX IF NOT EXISTS ix_expense_description_search ON expense "
+                   "USING gin (to_tsvector('simple', coalesce(description, '')))")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_income_description_search ON income "
+                   "USING gin (to_tsvector('simple', coalesce(description, '')))")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS transaction_search')
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_income_description_search')
+        op.execute('DROP INDEX IF EXISTS ix_expense_description_search')
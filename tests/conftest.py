@@ -0,0 +1,66 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from expense_tracker_app import create_app, db, User  # noqa: E402
+
+
+@pytest.fixture
+def app_config():
+    # Extra configuration for `app`; override in a test module
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    # A fresh SQLite file per test, with every background thread left to explicit calls
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_WORKERS': 0,
+        'MAIL_OUTBOX_MODE': 'worker',
+        'RATE_REFRESH_MODE': 'worker',
+        'RECURRING_MODE': 'worker',
+        'CACHE_URL': 'memory://',
+        **app_config,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)  # the models live on the default bind; a replica bind only mirrors it
+        db.session.add(User(username='alice', email='alice@example.com', password_hash='x', currency='USD'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def concurrently(app):
+    """Run function in `threads` threads, each in its own app context and released together; returns the results."""
+    def run(function, threads=4):
+        barrier = threading.Barrier(threads)
+        results, errors = [None] * threads, []
+
+        def target(index):
+            try:
+                with app.app_context():
+                    barrier.wait()
+                    results[index] = function()
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=target, args=(index,)) for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+        return results
+    return run
@@ -0,0 +1,179 @@
+import fnmatch
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from expense_tracker_app import MemoryCache, RedisCache, SQLiteCache
+
+
+class RESPStubHandler(socketserver.StreamRequestHandler):
+    # The handful of Redis commands RedisCache sends (AUTH, SELECT, GET, SET ... PX, DEL, SCAN, WATCH/MULTI/EXEC),
+    # over real RESP
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def bulk(self, value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def write(self, args):
+        # Every write bumps the key's version, which is what WATCH compares at EXEC
+        store, versions = self.server.store, self.server.versions
+        command = args[0].upper()
+        for key in args[1:2] if command == b'SET' else args[1:]:
+            versions[key] = versions.get(key, 0) + 1
+        if command == b'SET':
+            store[args[1]] = (args[2], time.time() + int(args[4]) / 1000)
+            return b'+OK\r\n'
+        return b':%d\r\n' % sum(store.pop(key, None) is not None for key in args[1:])
+
+    def handle(self):
+        store, versions, lock = self.server.store, self.server.versions, self.server.lock
+        watched, queued = {}, None
+        while (args := self.read_command()) is not None:
+            command = args[0].upper()
+            if queued is not None and command != b'EXEC':
+                queued.append(args)
+                reply = b'+QUEUED\r\n'
+            elif command == b'GET':
+                value, expires = store.get(args[1], (None, 0))
+                reply = self.bulk(value if expires > time.time() else None)
+            elif command in (b'SET', b'DEL'):
+                with lock:
+                    reply = self.write(args)
+            elif command == b'WATCH':
+                watched.update((key, versions.get(key, 0)) for key in args[1:])
+                reply = b'+OK\r\n'
+            elif command == b'UNWATCH':
+                watched = {}
+                reply = b'+OK\r\n'
+            elif command == b'MULTI':
+                queued = []
+                reply = b'+OK\r\n'
+            elif command == b'EXEC':
+                with lock:
+                    if any(versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = b'*-1\r\n'
+                    else:
+                        reply = b'*%d\r\n' % len(queued) + b''.join(self.write(queued_args) for queued_args in queued)
+                watched, queued = {}, None
+            elif command == b'SCAN':
+                keys = [key for key in list(store) if fnmatch.fnmatchcase(key, args[3])]
+                reply = b'*2\r\n' + self.bulk(b'0') + b'*%d\r\n' % len(keys) + b''.join(map(self.bulk, keys))
+            elif command in (b'AUTH', b'SELECT'):
+                self.server.handshake.append(args)
+                reply = b'+OK\r\n'
+            else:
+                reply = b'-ERR unknown command\r\n'
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RESPStubHandler)
+    server.daemon_threads = True
+    server.store, server.versions, server.handshake, server.lock = {}, {}, [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def redis_cache(port, namespace='rates', ttl=60, path='/0', retry_after=5):
+    return RedisCache(namespace, ttl, f'redis://:secret@127.0.0.1:{port}{path}', 0.5, retry_after)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_values_round_trip_through_the_server(app, redis_server):
+    cache = redis_cache(redis_server.server_address[1], path='/2')
+    with app.app_context():
+        cache.set('snapshot', {'EUR': 0.9})
+        assert cache.get('snapshot') == {'EUR': 0.9}
+        assert list(redis_server.store) == [b'expense_tracker:rates:snapshot']
+        assert redis_server.handshake == [[b'AUTH', b'secret'], [b'SELECT', b'2']]
+        cache.delete('snapshot')
+        assert cache.get('snapshot', 'missing') == 'missing'
+
+
+def test_clear_only_removes_its_namespace(app, redis_server):
+    port = redis_server.server_address[1]
+    rates, users = redis_cache(port, 'rates'), redis_cache(port, 'users')
+    with app.app_context():
+        rates.set('a', 1)
+        rates.set('b', 2)
+        users.set('a', 3)
+        rates.clear()
+        assert (rates.get('a'), rates.get('b'), users.get('a')) == (None, None, 3)
+
+
+def test_expired_values_are_misses(app, redis_server):
+    cache = redis_cache(redis_server.server_address[1], ttl=0.05)
+    with app.app_context():
+        cache.set('k', 1)
+        time.sleep(0.1)
+        assert cache.get('k') is None
+
+
+def test_unreachable_server_is_skipped_until_the_retry_delay(app, monkeypatch):
+    connects = []
+    create_connection = socket.create_connection
+    monkeypatch.setattr(socket, 'create_connection', lambda *args, **kwargs: (
+        connects.append(args), create_connection(*args, **kwargs))[1])
+    cache = redis_cache(unused_port(), retry_after=0.2)
+    with app.app_context():
+        for _ in range(20):
+            assert cache.get('k', 'miss') == 'miss'
+            cache.set('k', 1)
+        assert len(connects) == 1
+        time.sleep(0.25)
+        assert cache.get('k', 'miss') == 'miss'
+        assert len(connects) == 2
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        cache = MemoryCache('years', 60)  # per process, so every worker here shares it
+        return lambda: cache
+    if request.param == 'sqlite':
+        return lambda: SQLiteCache('years', 60, str(tmp_path / 'cache.db'), 5)
+    port = request.getfixturevalue('redis_server').server_address[1]
+    return lambda: redis_cache(port, 'years')
+
+
+def test_concurrent_updates_keep_every_change(app, backend, concurrently):
+    # One cache object per thread stands in for one per worker process
+    shared = backend()
+    shared.set(1, frozenset())
+    caches = iter([shared] + [backend() for _ in range(3)])
+    added = iter(range(4))
+
+    def add_years():
+        cache, first = next(caches), next(added) * 25
+        for year in range(first, first + 25):
+            cache.update(1, lambda years: years | {year})
+
+    concurrently(add_years)
+    assert shared.get(1) == frozenset(range(100))
+
+
+def test_update_leaves_a_missing_entry_alone(app, backend):
+    cache = backend()
+    with app.app_context():
+        cache.update(1, lambda years: None if years is None else years | {2026})
+        assert cache.get(1) is None
+
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from expense_tracker_app import (CURRENCY_CONVERSION_LEASE, CurrencyConversion, claim_currency_conversion, db,
+                                 renew_currency_conversion)
+
+
+def expired():
+    return datetime.utcnow() - CURRENCY_CONVERSION_LEASE - timedelta(seconds=1)
+
+
+def add_job(**values):
+    job = CurrencyConversion(user_id=1, old_currency='USD', new_currency='EUR', rate=0.5, **values)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_only_one_worker_claims_a_job(app, concurrently):
+    with app.app_context():
+        job_id = add_job()
+    heartbeats = concurrently(lambda: claim_currency_conversion(job_id), threads=8)
+    assert sum(heartbeat is not None for heartbeat in heartbeats) == 1
+
+
+def test_live_job_is_not_claimed_and_stale_one_is_taken_over(app, concurrently):
+    with app.app_context():
+        live = add_job(status='running')
+        stale = add_job(status='running', updated_at=expired())
+        assert claim_currency_conversion(live) is None
+    heartbeats = concurrently(lambda: claim_currency_conversion(stale))
+    assert sum(heartbeat is not None for heartbeat in heartbeats) == 1
+
+
+def test_previous_holder_cannot_write_after_a_takeover(app):
+    with app.app_context():
+        job_id = add_job()
+        first = claim_currency_conversion(job_id)
+        db.session.execute(db.update(CurrencyConversion).where(CurrencyConversion.id == job_id).values(
+            updated_at=expired()))
+        db.session.commit()
+        second = claim_currency_conversion(job_id)
+        assert second is not None
+        assert renew_currency_conversion(job_id, first, converted_rows=5) is None
+        db.session.rollback()
+        assert renew_currency_conversion(job_id, second, converted_rows=5) is not None
+        db.session.commit()
+        assert db.session.get(CurrencyConversion, job_id).converted_rows == 5
@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from expense_tracker_app import db
+
+
+def test_metrics_are_off_without_a_token(app):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'http_requests_total' in response.get_data(as_text=True)
+
+
+def test_failed_statements_leave_no_timer_behind(app):
+    with app.app_context():
+        connection = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql('SELECT * FROM no_such_table')
+        connection.exec_driver_sql('SELECT 1')
+        assert connection.info['query_started'] == []
@@ -0,0 +1,85 @@
+import socketserver
+import threading
+from collections import Counter
+
+import pytest
+
+from expense_tracker_app import OutboxMessage, db, deliver_outbox, enqueue_mail
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: accepts every message and records its recipients
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 stub')
+        recipients = []
+        for line in self.rfile:
+            verb = line[:4].decode().upper()
+            if verb in ('EHLO', 'HELO', 'RSET', 'NOOP'):
+                self.reply('250 ok')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 ok')
+            elif verb == 'RCPT':
+                recipients.append(line.decode().split(':', 1)[1].strip().strip('<>'))
+                self.reply('250 ok')
+            elif verb == 'DATA':
+                self.reply('354 end with .')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                with self.server.lock:
+                    self.server.delivered.update(recipients)
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStubHandler)
+    server.daemon_threads = True
+    server.delivered, server.lock = Counter(), threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mail_app(app, smtp_server):
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USERNAME='app@example.com', MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False,
+                      MAIL_OUTBOX_BATCH_SIZE=7)
+    return app
+
+
+def test_concurrent_senders_deliver_each_message_once(mail_app, smtp_server, concurrently):
+    with mail_app.app_context():
+        for i in range(120):
+            enqueue_mail(f'user{i}@example.com', 'Hello', 'body')
+        db.session.commit()
+
+    def drain():
+        while deliver_outbox():
+            pass
+
+    concurrently(drain)
+    assert len(smtp_server.delivered) == 120
+    assert set(smtp_server.delivered.values()) == {1}
+    with mail_app.app_context():
+        assert OutboxMessage.query.filter_by(status='sent').count() == 120
+
+
+def test_claimed_messages_are_skipped_by_other_senders(mail_app, smtp_server):
+    with mail_app.app_context():
+        enqueue_mail('bob@example.com', 'Hello', 'body')
+        db.session.commit()
+        assert deliver_outbox() == 1
+        assert deliver_outbox() == 0
+    assert smtp_server.delivered == Counter({'bob@example.com': 1})
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine
+
+from expense_tracker_app import TaskLease, User, claim_task_lease, db
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'SQLALCHEMY_BINDS': {'replica': f"sqlite:///{tmp_path / 'replica.db'}"}}
+
+
+@pytest.fixture
+def replica(app):
+    # A replica that has the schema but none of the primary's rows, like one lagging far behind
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica'])
+    return app
+
+
+def test_plain_reads_go_to_the_replica(replica):
+    with replica.app_context():
+        g.use_read_replica = True
+        assert db.session.get(User, 1) is None
+        assert db.session.execute(db.select(User).with_for_update()).scalar() is not None
+
+
+def test_reads_after_a_write_go_to_the_primary(replica):
+    with replica.app_context():
+        g.use_read_replica = True
+        db.session.execute(db.update(User).where(User.id == 1).values(data_version=User.data_version + 1))
+        assert db.session.get(User, 1).data_version == 1
+
+
+def test_lease_reads_go_to_the_primary(replica):
+    with replica.app_context():
+        assert claim_task_lease('job', timedelta(minutes=1))
+    with replica.app_context():
+        g.use_read_replica = True
+        assert db.session.get(TaskLease, 'job') is not None
+        assert not claim_task_lease('job', timedelta(minutes=1))
+
+
+def test_pragmas_only_apply_to_the_apps_engines(app, tmp_path):
+    other = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    with other.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+    other.dispose()
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from expense_tracker_app import CategoryRollup, apply_rollup_deltas, db, rebuild_rollups, update_rollup, upsert_rollups
+
+KEY = ('Expense', 2026, 1, 'Food', 'USD')
+
+
+def stored_rollup():
+    rollup = CategoryRollup.query.one()
+    return rollup.total, rollup.count
+
+
+def test_concurrent_upserts_sum_every_delta(app, concurrently):
+    def write():
+        for _ in range(50):
+            upsert_rollups([dict(user_id=1, year=2026, month=1, type='Expense', category='Food', currency='USD',
+                                 total=1.0, count=1)])
+            db.session.commit()
+            update_rollup(1, 'Expense', datetime(2026, 1, 5), 'Food', 'USD', 1.0)
+            db.session.commit()
+            apply_rollup_deltas(1, {KEY: [1.0, 1]})
+            db.session.commit()
+
+    concurrently(write)
+    with app.app_context():
+        assert stored_rollup() == (600.0, 600)
+
+
+def test_rollup_is_deleted_when_its_last_row_goes(app):
+    with app.app_context():
+        update_rollup(1, 'Expense', datetime(2026, 1, 5), 'Food', 'USD', 12.5)
+        update_rollup(1, 'Expense', datetime(2026, 1, 9), 'Food', 'USD', 7.5)
+        db.session.commit()
+        assert stored_rollup() == (20.0, 2)
+        update_rollup(1, 'Expense', datetime(2026, 1, 5), 'Food', 'USD', -12.5, -1)
+        db.session.commit()
+        assert stored_rollup() == (7.5, 1)
+        update_rollup(1, 'Expense', datetime(2026, 1, 9), 'Food', 'USD', -7.5, -1)
+        db.session.commit()
+        assert CategoryRollup.query.count() == 0
+        assert rebuild_rollups(verify_only=True) == []
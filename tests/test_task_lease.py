@@ -0,0 +1,59 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from expense_tracker_app import ExchangeRate, TaskLease, claim_task_lease, db, refresh_rates_once
+
+
+class RateAPIStub(BaseHTTPRequestHandler):
+    # Stands in for the exchange-rate API; slow enough that concurrent callers overlap
+    def do_GET(self):
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(0.2)
+        body = json.dumps({'result': 'success', 'conversion_rates': {'USD': 1, 'EUR': 0.9, 'GBP': 0.8, 'NGN': 1500}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def rate_api(app):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RateAPIStub)
+    server.calls, server.lock = 0, threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config['EXCHANGE_RATE_API_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_one_worker_wins_a_new_lease(app, concurrently):
+    won = concurrently(lambda: claim_task_lease('job', timedelta(minutes=1)), threads=8)
+    assert won.count(True) == 1
+
+
+def test_one_worker_wins_an_expired_lease(app, concurrently):
+    with app.app_context():
+        db.session.add(TaskLease(name='job', locked_until=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+    won = concurrently(lambda: claim_task_lease('job', timedelta(minutes=1)), threads=8)
+    assert won.count(True) == 1
+    with app.app_context():
+        assert not claim_task_lease('job', timedelta(minutes=1))
+
+
+def test_concurrent_refreshes_call_the_api_once(app, rate_api, concurrently):
+    refreshed = concurrently(refresh_rates_once)
+    assert refreshed.count(True) == 1
+    assert rate_api.calls == 1
+    with app.app_context():
+        assert ExchangeRate.query.count() == 4